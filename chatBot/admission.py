@@ -0,0 +1,169 @@
+import asyncio
+import math
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+import logging
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Request turned away before doing any work; carries the HTTP status and a Retry-After hint"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token; returns 0 on success, otherwise seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per key (session or client IP), keeping only the most recently seen keys"""
+
+    def __init__(self, per_minute: int, burst: int, max_keys: int):
+        self.rate = per_minute / 60.0
+        self.capacity = max(burst, 1)
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, key: str) -> float:
+        if not self.enabled:
+            return 0.0
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take()
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue in front of the inference stage.
+
+    At most max_concurrency requests run matching at once and at most max_queue
+    wait for a slot; anything beyond that, or waiting longer than queue_timeout,
+    is rejected immediately instead of piling up behind the shared executor.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.avg_service_time = 0.5  # EWMA of seconds a slot is held, for Retry-After
+        self.counters = Counter()
+
+        self.session_limiter = RateLimiter(
+            settings.RATE_LIMIT_SESSION_PER_MINUTE, settings.RATE_LIMIT_SESSION_BURST, settings.RATE_LIMIT_MAX_KEYS
+        )
+        self.ip_limiter = RateLimiter(
+            settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST, settings.RATE_LIMIT_MAX_KEYS
+        )
+
+    def _retry_after(self) -> int:
+        backlog = (self.waiting + 1) / max(self.max_concurrency, 1)
+        return max(1, math.ceil(backlog * self.avg_service_time))
+
+    def check_rate(self, session_id: Optional[str], client_ip: Optional[str]):
+        """Raise a 429 rejection if the session or client IP is over its rate"""
+        checks = ((self.session_limiter, session_id, "session_rate_limited"), (self.ip_limiter, client_ip, "ip_rate_limited"))
+        for limiter, key, reason in checks:
+            if not key:
+                continue
+            wait = limiter.check(key)
+            if wait > 0:
+                self.counters[reason] += 1
+                raise AdmissionRejected(429, reason, max(1, math.ceil(wait)))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold an inference slot; raises a 503 rejection when the queue is full or the wait times out"""
+        if self.semaphore.locked() and self.waiting >= self.max_queue:
+            self.counters["queue_full"] += 1
+            raise AdmissionRejected(503, "queue_full", self._retry_after())
+
+        self.waiting += 1
+        acquire = asyncio.ensure_future(self.semaphore.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except BaseException:
+            self._abandon(acquire)  # request cancelled while queued
+            raise
+        finally:
+            self.waiting -= 1
+        if not acquire.done():
+            self._abandon(acquire)
+            self.counters["queue_timeout"] += 1
+            raise AdmissionRejected(503, "queue_timeout", self._retry_after())
+
+        self.active += 1
+        self.counters["admitted"] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.avg_service_time = 0.9 * self.avg_service_time + 0.1 * (time.perf_counter() - start)
+            self.active -= 1
+            self.semaphore.release()
+
+    def _abandon(self, acquire: asyncio.Future):
+        """Give up on a semaphore acquire; a permit it obtains anyway (e.g. just as the wait timed out) is released"""
+        def release_if_acquired(future: asyncio.Future):
+            if not future.cancelled() and future.exception() is None:
+                self.semaphore.release()
+
+        acquire.cancel()
+        acquire.add_done_callback(release_if_acquired)
+
+    def record_degraded(self, reason: str):
+        self.counters["degraded"] += 1
+        logger.warning(f"Admission {reason}, serving lexical-only response")
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_service_ms": round(self.avg_service_time * 1000, 1),
+            "counters": dict(self.counters),
+        }
+
+
+# Global admission controller for /chat
+admission = AdmissionController(
+    settings.ADMISSION_MAX_CONCURRENCY, settings.ADMISSION_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+)
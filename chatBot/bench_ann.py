@@ -0,0 +1,118 @@
+"""Recall@k, latency and memory of vector index configurations against exact float32 search.
+
+Covers the IVF-flat index (nlist/nprobe) and compressed embedding storage
+(float16, per-row int8) with float32 rescoring of the top candidates.
+
+Usage:
+    python bench_ann.py --rows 200000 --nlist 0 --nprobe 1 4 8 16 32
+    python bench_ann.py --storage float32 float16 int8 --rescore 0 32
+    python bench_ann.py --index faq_index.npz   # benchmark on real persisted embeddings
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from vector_index import ExactIndex, IVFFlatIndex, load_index, normalize
+
+
+def synthetic_corpus(rows: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered unit vectors, roughly shaped like paraphrase embeddings of many FAQs"""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((clusters, dim)))
+    members = centers[rng.integers(0, clusters, rows)]
+    return normalize(members + 1.4 * rng.standard_normal((rows, dim)) / np.sqrt(dim))
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed corpus vectors, standing in for user rephrasings"""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    return normalize(picks + 0.8 * rng.standard_normal(picks.shape) / np.sqrt(vectors.shape[1]))
+
+
+def time_searches(index: ExactIndex, queries: np.ndarray, k: int):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids, _ = index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    return results, np.array(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Persisted .npz index to take vectors from (default: synthetic corpus)")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=2_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, nargs="+", default=[0])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--storage", nargs="+", default=["float32"], choices=["float32", "float16", "int8"])
+    parser.add_argument("--rescore", type=int, nargs="+", default=[32], help="float32 rescoring candidates (0 disables)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.index:
+        source, _ = load_index(args.index)
+        rows = np.flatnonzero(source.alive)
+        vectors = np.asarray(source.exact[rows]) if source.exact is not None else source._decode(rows)
+    else:
+        vectors = synthetic_corpus(args.rows, args.dim, args.clusters, args.seed)
+    ids = np.arange(len(vectors))
+    queries = make_queries(vectors, args.queries, args.seed)
+    print(f"corpus: {len(vectors)} x {vectors.shape[1]}, queries: {len(queries)}, k={args.k}")
+
+    exact = ExactIndex(vectors.shape[1])
+    exact.add(ids, vectors)
+    truth, _ = time_searches(exact, queries, args.k)
+
+    print(f"{'index':<40}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'MB':>10}{'build s':>10}")
+
+    def report(label: str, index: ExactIndex, build_seconds: float):
+        found, latency = time_searches(index, queries, args.k)
+        recall = np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)])
+        print(
+            f"{label:<40}{recall:>10.3f}{np.percentile(latency, 50):>10.2f}{np.percentile(latency, 95):>10.2f}"
+            f"{index.nbytes / 2**20:>10.1f}{build_seconds:>10.1f}"
+        )
+
+    for storage in args.storage:
+        # float32 storage never rescores, so only run it once
+        for rescore in (args.rescore if storage != "float32" else [0]):
+            # Memory is reported as if the float32 rescoring rows were memory-mapped from disk
+            def build(cls, **params):
+                start = time.perf_counter()
+                index = cls(vectors.shape[1], storage=storage, rescore=rescore, **params)
+                index.add(ids, vectors)
+                if index.exact is not None:
+                    index.exact = _as_memmap(index.exact)
+                return index, time.perf_counter() - start
+
+            suffix = f"{storage}" + (f" rescore={rescore}" if storage != "float32" else "")
+            index, build_seconds = build(ExactIndex)
+            report(f"exact {suffix}", index, build_seconds)
+
+            for nlist in args.nlist:
+                ivf, build_seconds = build(IVFFlatIndex, nlist=nlist, seed=args.seed)
+                for nprobe in args.nprobe:
+                    ivf.nprobe = nprobe
+                    report(f"ivf {ivf.nlist}/{nprobe} {suffix}", ivf, build_seconds)
+
+
+def _as_memmap(matrix: np.ndarray) -> np.memmap:
+    """Move a matrix into a temporary memory-mapped file, as load_index does for rescoring rows"""
+    handle = tempfile.NamedTemporaryFile(suffix=".f32.npy", delete=False)
+    handle.close()
+    np.save(handle.name, matrix)
+    mapped = np.load(handle.name, mmap_mode="r")
+    os.unlink(handle.name)  # The mapping stays valid until it is released
+    return mapped
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Escalation rate and accuracy of cascaded matching versus always using the full model.
+
+Each query is matched twice against the same index snapshot: once with the
+cascade (small model first, full model on escalation) and once with the
+full model only. The report gives the share of queries each stage answered,
+how often the cascade's top FAQ agrees with the full model's, accuracy
+against labels when the eval set has them, and latency of both paths.
+
+Queries come from a JSONL eval set ({"query": ..., "language": ..., "faq_id": ...},
+language and faq_id optional) or from recent conversation logs.
+
+Usage:
+    CASCADE_MODEL_NAME=<small model> python cascade_report.py --eval eval_queries.jsonl
+    CASCADE_MODEL_NAME=<small model> python cascade_report.py --from-logs 2000 --out cascade_report.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from config import settings
+from database import db
+from nlp import nlp_service
+
+
+def load_eval_set(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as source:
+        return [json.loads(line) for line in source if line.strip()]
+
+
+async def load_logged_queries(limit: int) -> List[Dict[str, Any]]:
+    cursor = db.db[settings.CONVERSATIONS_COLLECTION].find(
+        {}, {"user_message": 1, "detected_language": 1, "_id": 0}
+    ).sort("timestamp", -1).limit(limit)
+    return [{"query": doc["user_message"], "language": doc.get("detected_language")} async for doc in cursor]
+
+
+def top_faq_id(matches) -> Optional[str]:
+    return matches[0][0].id if matches else None
+
+
+def percentile_ms(latencies: List[float], q: float) -> float:
+    return round(float(np.percentile(latencies, q)) * 1000, 2) if latencies else 0.0
+
+
+async def evaluate(queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    snapshot = nlp_service.snapshot
+    stages = {"lexical": 0, "cascade": 0, "escalated": 0, "degraded": 0}
+    agree = {"all": 0, "cascade": 0}
+    correct = {"full": 0, "cascaded": 0}
+    labeled = 0
+    full_latencies, cascaded_latencies = [], []
+
+    for item in queries:
+        query = item["query"]
+        language = item.get("language") or nlp_service.detect_language(query)[0]
+
+        start = time.perf_counter()
+        full = await nlp_service.find_best_match(query, language, snapshot=snapshot, cascade=False)
+        full_latencies.append(time.perf_counter() - start)
+
+        before = dict(nlp_service.match_counters)
+        start = time.perf_counter()
+        cascaded = await nlp_service.find_best_match(query, language, snapshot=snapshot)
+        cascaded_latencies.append(time.perf_counter() - start)
+        stage = next((name for name in stages if nlp_service.match_counters[name] > before.get(name, 0)), None)
+        if stage:
+            stages[stage] += 1
+
+        same = top_faq_id(full) == top_faq_id(cascaded)
+        agree["all"] += same
+        if stage == "cascade":
+            agree["cascade"] += same
+
+        if item.get("faq_id"):
+            labeled += 1
+            correct["full"] += top_faq_id(full) == item["faq_id"]
+            correct["cascaded"] += top_faq_id(cascaded) == item["faq_id"]
+
+    total = len(queries)
+    reached_cascade = stages["cascade"] + stages["escalated"]
+    report = {
+        "queries": total,
+        "cascade_model": settings.CASCADE_MODEL_NAME,
+        "full_model": settings.HF_MODEL_NAME,
+        "thresholds": {"min_score": settings.CASCADE_MIN_SCORE, "min_margin": settings.CASCADE_MIN_MARGIN},
+        "stages": stages,
+        "escalation_rate": round(stages["escalated"] / reached_cascade, 4) if reached_cascade else 0.0,
+        "top1_agreement": round(agree["all"] / total, 4) if total else 0.0,
+        "top1_agreement_when_cascade_answered": round(agree["cascade"] / stages["cascade"], 4) if stages["cascade"] else 0.0,
+        "latency_ms": {
+            "full": {"p50": percentile_ms(full_latencies, 50), "p95": percentile_ms(full_latencies, 95)},
+            "cascaded": {"p50": percentile_ms(cascaded_latencies, 50), "p95": percentile_ms(cascaded_latencies, 95)},
+        },
+    }
+    if labeled:
+        report["labeled_queries"] = labeled
+        report["accuracy"] = {name: round(count / labeled, 4) for name, count in correct.items()}
+    return report
+
+
+async def run_report(args: argparse.Namespace):
+    if not settings.CASCADE_MODEL_NAME:
+        raise SystemExit("Set CASCADE_MODEL_NAME to the first-stage model to evaluate")
+
+    await db.connect()
+    try:
+        await nlp_service.initialize()
+        await nlp_service.load_faqs(db.iter_faq_records())
+        queries = load_eval_set(args.eval) if args.eval else await load_logged_queries(args.from_logs)
+        report = await evaluate(queries)
+    finally:
+        await db.close()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as target:
+            target.write(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--eval", help="JSONL eval set of queries, optionally labeled with faq_id")
+    source.add_argument("--from-logs", type=int, default=1000, help="Use this many recent logged user messages")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_report(args))
+
+
+if __name__ == "__main__":
+    main()
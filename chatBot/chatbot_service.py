@@ -1,21 +1,48 @@
 import asyncio
 import uuid
 import time
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, NamedTuple, Optional, Tuple
 import logging
 
 # Fixed imports - using relative imports for services directory
 from model import ChatMessage, ChatResponse, ConversationLog, User
-from nlp import nlp_service
-from database import db
+from nlp import FAQIndexSnapshot, nlp_service
+from bson import ObjectId
+from database import db, encode_page_token
 from config import settings
+from lexical import normalize_text
+from singleflight import SingleFlight
+from popularity import popularity_index
+from tenants import tenant_registry
+from shadow import ShadowSample, shadow_evaluator
+from logging_setup import bind_log_context
 
 logger = logging.getLogger(__name__)
 
+class ComputedAnswer(NamedTuple):
+    """Session-independent part of a reply, shared by coalesced identical requests"""
+    response: str
+    confidence: float
+    category: Optional[str]
+    suggestions: Tuple[str, ...]
+    fallback: bool
+    faq_id: Optional[str] = None
+
+class SessionTurn(NamedTuple):
+    """One logged exchange, kept in the session's ring buffer"""
+    id: ObjectId  # conversation log _id, for page tokens
+    user_message: str
+    bot_response: str
+    language: str
+    confidence: float
+    timestamp: datetime
+
 class ChatbotService:
     def __init__(self):
-        self.active_sessions = {}  # Store session contexts
+        self.active_sessions = OrderedDict()  # Session contexts, least recently active first
+        self.answer_flights = SingleFlight("answers")
         self.fallback_responses = {
             "en": {
                 "no_match": "I'm sorry, I couldn't find a specific answer to your question. Let me connect you with a human assistant. You can contact our support at {contact}.",
@@ -31,27 +58,36 @@ class ChatbotService:
             }
         }
     
-    async def process_message(self, message: ChatMessage) -> ChatResponse:
-        """Process incoming chat message and generate response"""
+    async def process_message(self, message: ChatMessage, degraded: bool = False) -> ChatResponse:
+        """Process incoming chat message and generate response
+        
+        degraded skips the encoder and matches lexically, for when the server is overloaded.
+        """
         start_time = time.time()
         
         try:
             # Generate session ID if not provided
             session_id = message.session_id or str(uuid.uuid4())
             message_id = str(uuid.uuid4())
+            bind_log_context(session_id=session_id, message_id=message_id)
+            
+            # Pin one FAQ index snapshot (of the message's tenant) for the whole request
+            snapshot = await tenant_registry.snapshot(message.tenant_id)
             
             # Detect language if auto
+            stage_start = time.perf_counter()
             detected_language, lang_confidence = nlp_service.detect_language(message.message)
             if message.language != "auto":
                 detected_language = message.language
+            timings = {"detect_ms": round((time.perf_counter() - stage_start) * 1000, 2)}
             
             # Update session context
-            await self._update_session_context(session_id, message.message, detected_language)
+            await self._update_session_context(session_id, message.message, detected_language, new_session=message.session_id is None)
             
             # Check for greeting or farewell
             if self._is_greeting(message.message):
                 response_text = self._get_fallback_response("greeting", detected_language)
-                suggestions = await nlp_service.generate_suggestions(language=detected_language)
+                suggestions = await self._suggestions(None, detected_language, snapshot)
                 
                 response = ChatResponse(
                     response=response_text,
@@ -85,64 +121,43 @@ class ChatbotService:
                 await self._log_conversation(message, response, start_time, fallback=False)
                 return response
             
-            # Find best matching FAQ
-            matches = await nlp_service.find_best_match(
-                message.message, 
-                detected_language, 
-                top_k=3
+            # Identical questions in flight share one match/generate/translate computation
+            flight_key = (normalize_text(message.message) or message.message, detected_language, degraded, snapshot.version)
+            stage_start = time.perf_counter()
+            answer = await self.answer_flights.do(
+                flight_key,
+                lambda: self._compute_answer(message.message, detected_language, degraded, snapshot)
             )
+            timings["answer_ms"] = round((time.perf_counter() - stage_start) * 1000, 2)
             
-            if matches and matches[0][1] >= settings.CONFIDENCE_THRESHOLD:
-                # Found good match
-                best_faq, confidence, matched_question = matches[0]
-                
-                # Generate response in user's language
-                response_text = await nlp_service.generate_response(best_faq, detected_language)
-                
-                # Generate suggestions
-                suggestions = await nlp_service.generate_suggestions(
-                    best_faq.category, 
-                    detected_language
-                )
-                
-                response = ChatResponse(
-                    response=response_text,
-                    confidence=confidence,
-                    detected_language=detected_language,
-                    session_id=session_id,
-                    message_id=message_id,
-                    category=best_faq.category,
-                    suggested_questions=suggestions
-                )
-                
-                # Log conversation
-                await self._log_conversation(message, response, start_time, fallback=False)
-                return response
+            response = ChatResponse(
+                response=answer.response,
+                confidence=answer.confidence,
+                detected_language=detected_language,
+                session_id=session_id,
+                message_id=message_id,
+                fallback_to_human=answer.fallback,
+                suggested_questions=list(answer.suggestions),
+                category=answer.category
+            )
             
-            else:
-                # No good match found - fallback to human
-                response_text = self._get_fallback_response("no_match", detected_language).format(
-                    contact=settings.SUPPORT_CONTACT
-                )
-                
-                # Try to categorize query for better suggestions
-                category = nlp_service.categorize_query(message.message)
-                suggestions = await nlp_service.generate_suggestions(category, detected_language)
-                
-                response = ChatResponse(
-                    response=response_text,
-                    confidence=0.0,
-                    detected_language=detected_language,
-                    session_id=session_id,
-                    message_id=message_id,
-                    fallback_to_human=True,
-                    suggested_questions=suggestions,
-                    category=category
-                )
-                
-                # Log conversation
-                await self._log_conversation(message, response, start_time, fallback=True)
-                return response
+            # Log conversation
+            stage_start = time.perf_counter()
+            await self._log_conversation(message, response, start_time, fallback=answer.fallback, faq_id=answer.faq_id)
+            timings["log_ms"] = round((time.perf_counter() - stage_start) * 1000, 2)
+            
+            # One structured record per answered message
+            logger.info(
+                f"Answered message with confidence {answer.confidence:.2f}",
+                extra={
+                    "language": detected_language,
+                    "category": answer.category,
+                    "degraded": degraded,
+                    "fallback": answer.fallback,
+                    "timings": timings,
+                }
+            )
+            return response
         
         except Exception as e:
             logger.error(f"Error processing message: {e}")
@@ -163,15 +178,65 @@ class ChatbotService:
             
             return response
     
-    async def _update_session_context(self, session_id: str, message: str, language: str):
+    async def _compute_answer(self, text: str, language: str, degraded: bool, snapshot: FAQIndexSnapshot) -> ComputedAnswer:
+        """Match, generate and translate the answer to a question"""
+        # Find best matching FAQ
+        if degraded:
+            matches = nlp_service.find_lexical_match(text, language, top_k=3, snapshot=snapshot)
+        else:
+            match_start = time.perf_counter()
+            matches = await nlp_service.find_best_match(text, language, top_k=3, snapshot=snapshot)
+            matched = matches and matches[0][1] >= settings.CONFIDENCE_THRESHOLD
+            # Score a sample with the candidate encoder in the background
+            shadow_evaluator.offer(ShadowSample(
+                text, language, snapshot,
+                matches[0][0].id if matched else None,
+                matches[0][1] if matched else 0.0,
+                (time.perf_counter() - match_start) * 1000,
+            ))
+        
+        if matches and matches[0][1] >= settings.CONFIDENCE_THRESHOLD:
+            # Found good match
+            best_faq, confidence, matched_question = matches[0]
+            
+            # Generate response in user's language
+            response_text = await nlp_service.generate_response(best_faq, language)
+            suggestions = await self._suggestions(best_faq.category, language, snapshot, exclude=best_faq.id)
+            return ComputedAnswer(response_text, confidence, best_faq.category, tuple(suggestions), False, best_faq.id)
+        
+        # No good match found - fallback to human
+        response_text = self._get_fallback_response("no_match", language).format(
+            contact=settings.SUPPORT_CONTACT
+        )
+        
+        # Try to categorize query for better suggestions
+        category = nlp_service.categorize_query(text)
+        suggestions = await self._suggestions(category, language, snapshot)
+        return ComputedAnswer(response_text, 0.0, category, tuple(suggestions), True)
+    
+    async def _suggestions(self, category: Optional[str], language: str, snapshot: FAQIndexSnapshot,
+                           exclude: Optional[str] = None) -> List[str]:
+        """Most asked questions from the popularity table, or catalogue order before it is built"""
+        popular = popularity_index.suggestions(category, language, snapshot, exclude=exclude)
+        if popular is not None:
+            return popular
+        return await nlp_service.generate_suggestions(category, language, snapshot=snapshot)
+    
+    async def _update_session_context(self, session_id: str, message: str, language: str, new_session: bool = False):
         """Update session context for conversation continuity"""
         if session_id not in self.active_sessions:
             self.active_sessions[session_id] = {
                 "messages": [],
                 "language": language,
                 "last_category": None,
-                "created_at": datetime.now()
+                "created_at": datetime.now(),
+                "turns": deque(maxlen=settings.SESSION_HISTORY_TURNS),  # newest last
+                "logged_turns": 0,
+                "complete": new_session  # every turn of the session is in the buffer or counted in logged_turns
             }
+            while len(self.active_sessions) > settings.SESSION_MAX_RESIDENT:
+                self.active_sessions.popitem(last=False)
+        self.active_sessions.move_to_end(session_id)
         
         # Add message to context (keep last 5 messages)
         self.active_sessions[session_id]["messages"].append({
@@ -184,7 +249,8 @@ class ChatbotService:
         if len(self.active_sessions[session_id]["messages"]) > 5:
             self.active_sessions[session_id]["messages"] = self.active_sessions[session_id]["messages"][-5:]
     
-    async def _log_conversation(self, message: ChatMessage, response: ChatResponse, start_time: float, fallback: bool = False):
+    async def _log_conversation(self, message: ChatMessage, response: ChatResponse, start_time: float, fallback: bool = False,
+                                faq_id: Optional[str] = None):
         """Log conversation to database"""
         try:
             response_time = int((time.time() - start_time) * 1000)  # Convert to milliseconds
@@ -198,11 +264,25 @@ class ChatbotService:
                 detected_language=response.detected_language,
                 confidence=response.confidence,
                 category=response.category,
+                faq_id=faq_id,
+                tenant_id=message.tenant_id or settings.DEFAULT_TENANT,
                 fallback_triggered=fallback,
                 response_time_ms=response_time
             )
             
-            await db.log_conversation(conversation_log)
+            conversation_id = await db.log_conversation(conversation_log)
+            
+            # Keep the turn for history reads of a live session
+            session = self.active_sessions.get(response.session_id)
+            if session is not None:
+                # BSON dates have millisecond precision; match the stored value so page tokens line up
+                timestamp = conversation_log.timestamp
+                session["turns"].append(SessionTurn(
+                    ObjectId(conversation_id), conversation_log.user_message, conversation_log.bot_response,
+                    conversation_log.detected_language, conversation_log.confidence,
+                    timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000)
+                ))
+                session["logged_turns"] += 1
             
             # Update user if user_id provided
             if message.user_id:
@@ -271,32 +351,98 @@ class ChatbotService:
         # Default to English
         return self.fallback_responses["en"].get(response_type, "I'm sorry, I couldn't process your request.")
     
-    async def get_session_history(self, session_id: str) -> List[Dict]:
-        """Get conversation history for a session"""
+    async def get_session_history(
+        self, session_id: str, limit: int = 20, page_token: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Get a page of conversation history for a session and the token for older turns"""
+        session = self.active_sessions.get(session_id)
+        if session is not None and not page_token and not session["complete"] and settings.SESSION_HISTORY_FROM_MEMORY:
+            try:
+                await self._seed_session_history(session_id, session)
+            except Exception as e:
+                logger.error(f"Error seeding session history: {e}")
+        
+        resident = self._resident_history(session_id, limit, page_token)
+        if resident is not None:
+            return resident
+        
         try:
-            conversations = await db.get_conversation_history(session_id, limit=20)
+            conversations, next_token = await db.get_conversation_history(session_id, limit, page_token)
             
             history = []
             for conv in conversations:
                 history.append({
-                    "user_message": conv.user_message,
-                    "bot_response": conv.bot_response,
-                    "timestamp": conv.timestamp,
-                    "confidence": conv.confidence,
-                    "language": conv.detected_language
+                    "user_message": conv["user_message"],
+                    "bot_response": conv["bot_response"],
+                    "timestamp": conv["timestamp"],
+                    "confidence": conv["confidence"],
+                    "language": conv["detected_language"]
                 })
             
-            return history[::-1]  # Return in chronological order
+            return history[::-1], next_token  # Return in chronological order
         
+        except ValueError:
+            raise  # Malformed page token, reported to the caller
         except Exception as e:
             logger.error(f"Error getting session history: {e}")
-            return []
+            return [], None
+    
+    async def _seed_session_history(self, session_id: str, session: Dict):
+        """Fill a resumed session's ring buffer with its latest turns from the database"""
+        conversations, next_token = await db.get_conversation_history(session_id, settings.SESSION_HISTORY_TURNS)
+        seen = {conv["_id"] for conv in conversations}
+        turns = [
+            SessionTurn(conv["_id"], conv["user_message"], conv["bot_response"], conv["detected_language"],
+                        conv["confidence"], conv["timestamp"])
+            for conv in reversed(conversations)
+        ]
+        # Turns logged here while the query ran are newer than everything it returned
+        turns += [turn for turn in session["turns"] if turn.id not in seen]
+        session["turns"].clear()
+        session["turns"].extend(turns)
+        # One more than buffered when older turns remain, so they are still paged from the database
+        session["logged_turns"] = len(turns) + (1 if next_token else 0)
+        session["complete"] = True
+    
+    def _resident_history(
+        self, session_id: str, limit: int, page_token: Optional[str]
+    ) -> Optional[Tuple[List[Dict], Optional[str]]]:
+        """First history page of a live session from its ring buffer, or None if the database is needed.
+        
+        The buffer only holds turns handled by this process, so this relies on a single worker or
+        session-sticky routing; SESSION_HISTORY_FROM_MEMORY=False always reads the database.
+        """
+        session = self.active_sessions.get(session_id)
+        if session is None or page_token or not settings.SESSION_HISTORY_FROM_MEMORY:
+            return None
+        
+        turns = session["turns"]
+        limit = max(1, min(limit, settings.MAX_PAGE_SIZE))
+        # Turns from before this process saw the session, or pushed out of the buffer, are only in the database
+        older_in_database = not session["complete"] or session["logged_turns"] > len(turns)
+        if len(turns) < limit and older_in_database:
+            return None
+        
+        page = list(turns)[-limit:]
+        history = [
+            {
+                "user_message": turn.user_message,
+                "bot_response": turn.bot_response,
+                "timestamp": turn.timestamp,
+                "confidence": turn.confidence,
+                "language": turn.language
+            }
+            for turn in page
+        ]
+        
+        has_older = len(turns) > limit or older_in_database
+        next_token = encode_page_token({"timestamp": page[0].timestamp, "_id": page[0].id}) if page and has_older else None
+        return history, next_token
     
-    async def get_popular_questions(self, language: str = "en", category: str = None) -> List[str]:
+    async def get_popular_questions(self, language: str = "en", category: str = None, tenant_id: Optional[str] = None) -> List[str]:
         """Get popular questions based on conversation logs"""
         try:
-            # This could be enhanced with actual analytics
-            return await nlp_service.generate_suggestions(category, language)
+            return await self._suggestions(category, language, await tenant_registry.snapshot(tenant_id))
         
         except Exception as e:
             logger.error(f"Error getting popular questions: {e}")
@@ -1,5 +1,5 @@
 import os
-from typing import List
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -12,11 +12,109 @@ class Settings(BaseSettings):
     CONVERSATIONS_COLLECTION: str = "conversations"
     FEEDBACK_COLLECTION: str = "feedback"
     USERS_COLLECTION: str = "users"
+    CONVERSATION_ARCHIVE_COLLECTION: str = "conversation_archive"  # Daily rollups of expired conversations
+    FAQ_CURSOR_BATCH_SIZE: int = 500  # Documents per round trip when streaming FAQs
+    MAX_PAGE_SIZE: int = 100  # Upper bound on conversations returned per page
+    SESSION_HISTORY_TURNS: int = 20  # Recent turns kept in memory per live session to serve history
+    SESSION_MAX_RESIDENT: int = 10000  # Live sessions kept in memory (least recently active evicted)
+    SESSION_HISTORY_FROM_MEMORY: bool = True  # Serve live session history from memory; needs one worker or session-sticky routing
+    EXPORT_BATCH_SIZE: int = 1000  # Cursor batch and NDJSON chunk size for exports
+    EXPORT_ROW_GROUP_SIZE: int = 50000  # Rows per Parquet row group
+    INGEST_BATCH_SIZE: int = 1000  # FAQ rows validated and written per bulk operation
+    
+    # Tenants (one FAQ catalogue per campus)
+    DEFAULT_TENANT: str = "default"  # Tenant of requests and FAQs without a tenant_id; loaded at startup
+    TENANT_NAMES: Dict[str, str] = {}  # Other tenants served: tenant_id -> college name
+    TENANT_PINNED: List[str] = []  # Tenants loaded at startup and never evicted
+    TENANT_MEMORY_BUDGET_MB: int = 1024  # Index memory for non-default tenants; least recently used evicted beyond it
+    
+    # Conversation Retention
+    CONVERSATION_RETENTION_MODE: str = "off"  # "off" (keep every log), "archive" (roll up, then delete) or "ttl" (Mongo TTL expiry)
+    CONVERSATION_RETENTION_DAYS: int = 180  # Raw conversation logs kept; at least POPULARITY_WINDOW_DAYS
+    ARCHIVE_TTL_DAYS: int = 0  # Expire archived rollups after this many days (0 keeps them)
+    ARCHIVE_INTERVAL: int = 3600  # Seconds between archival runs
+    
+    # Popularity-ranked Suggestions
+    POPULARITY_WINDOW_DAYS: int = 30  # Conversation history aggregated into demand
+    POPULARITY_HALF_LIFE_DAYS: float = 7.0  # Age at which a conversation counts half
+    POPULARITY_TOP_N: int = 10  # Questions kept per (category, language)
+    POPULARITY_REFRESH_INTERVAL: int = 900  # Seconds between rebuilds of the table
     
     # NLP Configuration
     HF_MODEL_NAME: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
     CONFIDENCE_THRESHOLD: float = 0.7
     
+    # Lexical / Hybrid Retrieval
+    LEXICAL_SHORTCUT_THRESHOLD: float = 0.9  # Query term coverage needed to answer without encoding
+    LEXICAL_SHORTCUT_MARGIN: float = 0.25  # Relative BM25 lead of the top hit over the runner-up
+    HYBRID_LEXICAL_WEIGHT: float = 0.3  # Share of the gap to 1.0 closed by a full lexical match
+    MAX_PENDING_ENCODES: int = 32  # In-flight query encodes before falling back to lexical only
+    CASCADE_MODEL_NAME: Optional[str] = None  # Small first-stage encoder (e.g. a 6-layer multilingual MiniLM); None disables
+    CASCADE_MIN_SCORE: float = 0.85  # Small-model top score needed to answer without the full model
+    CASCADE_MIN_MARGIN: float = 0.08  # Lead of the top FAQ over the next different FAQ
+    WARMUP_ENABLED: bool = True  # Run warm-up queries before reporting ready
+    WARMUP_ROUNDS: int = 2  # Passes over the supported languages; timings are from the last
+    
+    # Shadow Evaluation (candidate encoder scored off the response path)
+    SHADOW_MODEL_NAME: Optional[str] = None  # Candidate encoder; None disables shadow mode
+    SHADOW_SAMPLE_RATE: float = 0.05  # Fraction of answered /chat queries also scored by the candidate
+    SHADOW_MAX_PER_MINUTE: int = 60  # Shadow evaluations allowed per minute (burst of 10)
+    SHADOW_QUEUE_SIZE: int = 16  # Sampled queries waiting for the shadow worker; more are dropped
+    SHADOW_LATENCY_SAMPLES: int = 1000  # Latencies kept per language for percentiles
+    
+    # Vector Index
+    VECTOR_INDEX_TYPE: str = "exact"  # "exact" (brute force) or "ivf" (approximate, for large corpora)
+    IVF_NLIST: int = 0  # Number of IVF lists; 0 picks sqrt(number of question rows)
+    IVF_NPROBE: int = 8  # Lists scanned per query; higher trades latency for recall
+    VECTOR_INDEX_PATH: Optional[str] = None  # Persist the built index here (.npz) and reuse it on restart
+    EMBEDDING_STORAGE: str = "float32"  # "float32", "float16" or "int8" (per-row scaled)
+    EMBEDDING_RESCORE_CANDIDATES: int = 32  # Compressed-score candidates rescored in float32 (0 disables)
+    EMBEDDING_CHUNK_SIZE: int = 1024  # Questions encoded per batch while the FAQ cursor keeps streaming
+
+    # Admission Control (/chat)
+    ADMISSION_MAX_CONCURRENCY: int = 8  # Requests matching at once
+    ADMISSION_MAX_QUEUE: int = 32  # Requests allowed to wait for a slot; more are shed immediately
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0  # Seconds a request may wait for a slot
+    ADMISSION_OVERLOAD_MODE: str = "reject"  # "reject" (503 + Retry-After) or "degrade" (lexical-only answer)
+    RATE_LIMIT_SESSION_PER_MINUTE: int = 30  # Per-session token refill rate; 0 disables
+    RATE_LIMIT_SESSION_BURST: int = 10
+    RATE_LIMIT_IP_PER_MINUTE: int = 0  # Per-client-IP token refill rate; 0 disables (users behind one NAT share an IP)
+    RATE_LIMIT_IP_BURST: int = 60
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Key IP limits on the X-Forwarded-For address our (single, trusted) proxy appended
+    RATE_LIMIT_MAX_KEYS: int = 100000  # Buckets kept in memory (least recently seen evicted)
+    
+    # HTTP Caching (read-mostly GET endpoints)
+    HTTP_CACHE_ENABLED: bool = True
+    HTTP_CACHE_MAX_AGE: Dict[str, int] = {  # Cache-Control max-age (and server-side body TTL) per path, seconds
+        "/languages": 3600,
+        "/popular-questions": 300,
+        "/analytics/stats": 60,
+    }
+    HTTP_CACHE_MAX_ENTRIES: int = 1024  # Rendered bodies kept server-side (least recently used evicted)
+    STATS_ROLLUP_INTERVAL: int = 300  # Seconds analytics stats are reused before being re-aggregated
+    
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" (one object per line) or "text"
+    LOG_FILE: Optional[str] = None  # Also write logs here
+    LOG_QUEUE_SIZE: int = 10000  # Records buffered for the writer thread; overflow is dropped and counted
+    LOG_SAMPLE_RATES: Dict[str, float] = {"DEBUG": 1.0, "INFO": 1.0}  # Fraction kept per level; WARNING and above always kept
+    
+    # Memory Accounting
+    MEMORY_LOG_INTERVAL: int = 300  # Seconds between memory summary log lines; 0 disables
+    MEMORY_TRACEMALLOC_FRAMES: int = 0  # Start tracemalloc with this many frames for /admin/memory; 0 disables
+    
+    # Translation
+    TRANSLATE_SERVICE_URLS: Optional[List[str]] = None  # googletrans service hosts; None uses the library default
+    TRANSLATE_HTTP2: bool = True  # Multiplex translation requests over HTTP/2
+    TRANSLATE_MAX_CONNECTIONS: int = 20  # Size of the shared connection pool
+    TRANSLATE_TIMEOUT: float = 5.0  # Seconds per translation request
+    TRANSLATE_PROXY: Optional[str] = None  # Proxy URL for translation requests
+    TRANSLATE_BATCH_CONCURRENCY: int = 4  # Concurrent requests per batch translation
+    MATERIALIZE_TRANSLATIONS: bool = True  # Machine-translate FAQs into every supported language at ingest time
+    MATERIALIZE_BATCH_SIZE: int = 50  # FAQs translated per batch call and bulk write
+    LIVE_TRANSLATION_FALLBACK: bool = False  # Keep translating missing FAQ content per request after the first materialization sweep (always on before it)
+    
     # Supported Languages
     SUPPORTED_LANGUAGES: List[str] = [
         "en",  # English
@@ -1,24 +1,96 @@
 import motor.motor_asyncio
+from bson import ObjectId
 from config import settings
-from model import FAQ, ConversationLog, Feedback, User
-from typing import List, Optional, Dict, Any
+from model import FAQ, FAQRecord, ConversationLog, Feedback, User
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from datetime import datetime
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Fields needed to build the search index and serve answers
+FAQ_RECORD_PROJECTION = {
+    "question": 1,
+    "answer": 1,
+    "keywords": 1,
+    "category": 1,
+    "languages": 1,
+    "priority": 1,
+    "tenant_id": 1,
+}
+
+# Fields served by history views and admin dashboards
+CONVERSATION_HISTORY_PROJECTION = {
+    "user_message": 1,
+    "bot_response": 1,
+    "timestamp": 1,
+    "confidence": 1,
+    "detected_language": 1,
+}
+RECENT_CONVERSATION_PROJECTION = {
+    "session_id": 1,
+    "message_id": 1,
+    "user_message": 1,
+    "bot_response": 1,
+    "detected_language": 1,
+    "confidence": 1,
+    "category": 1,
+    "timestamp": 1,
+    "fallback_triggered": 1,
+    "response_time_ms": 1,
+}
+
+# Managed index plan for conversations: {name: keys}. Only the indexes it replaces are dropped.
+# Both keyset pages sort on (timestamp, _id), so their indexes end in that sort order:
+# (session_id, timestamp, _id) serves session history, (timestamp, _id) recent conversations;
+# (timestamp, detected_language) serves time-window analytics and language-filtered exports.
+CONVERSATION_INDEXES = {
+    "session_timestamp": [("session_id", 1), ("timestamp", -1), ("_id", -1)],
+    "timestamp_id": [("timestamp", -1), ("_id", -1)],
+    "timestamp_language": [("timestamp", -1), ("detected_language", 1)],
+}
+# Single-field indexes of earlier releases, each a prefix of a planned index or unused
+REPLACED_CONVERSATION_INDEXES = ("session_id_1", "timestamp_-1", "detected_language_1")
+
+def tenant_filter(tenant_id: str) -> Dict[str, Any]:
+    """Mongo filter for a tenant's documents; the default tenant also owns documents without a tenant_id"""
+    if tenant_id == settings.DEFAULT_TENANT:
+        return {"tenant_id": {"$in": [tenant_id, None]}}
+    return {"tenant_id": tenant_id}
+
+def conversation_retention_days() -> int:
+    """Days raw conversations are kept; never shorter than the popularity window that aggregates them"""
+    return max(settings.CONVERSATION_RETENTION_DAYS, settings.POPULARITY_WINDOW_DAYS)
+
+def encode_page_token(doc: Dict[str, Any]) -> str:
+    """Opaque continuation token for keyset pagination on (timestamp, _id)"""
+    payload = json.dumps({"t": doc["timestamp"].isoformat(), "i": str(doc["_id"])})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_page_token(token: str) -> Tuple[datetime, ObjectId]:
+    """Inverse of encode_page_token; raises ValueError for malformed tokens"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), ObjectId(payload["i"])
+    except Exception as e:
+        raise ValueError(f"Invalid page token: {token}") from e
+
 class Database:
     def __init__(self):
         self.client = None
         self.db = None
     
-    async def connect(self):
-        """Connect to MongoDB"""
+    async def connect(self, client=None):
+        """Connect to MongoDB, or use a given Motor-compatible client (e.g. an in-memory one for load tests)"""
         try:
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
+            self.client = client or motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
             self.db = self.client[settings.DATABASE_NAME]
             
             # Test connection
-            await self.client.admin.command('ping')
+            if client is None:
+                await self.client.admin.command('ping')
             logger.info(f"Connected to MongoDB: {settings.DATABASE_NAME}")
             
             # Create indexes
@@ -35,11 +107,24 @@ class Database:
             await self.db[settings.FAQ_COLLECTION].create_index([("category", 1)])
             await self.db[settings.FAQ_COLLECTION].create_index([("keywords", 1)])
             await self.db[settings.FAQ_COLLECTION].create_index([("is_active", 1)])
+            await self.db[settings.FAQ_COLLECTION].create_index([("tenant_id", 1), ("is_active", 1)])
+            # Questions are unique per tenant (replaces the global question_hash index)
+            if "question_hash_1" in await self.db[settings.FAQ_COLLECTION].index_information():
+                await self.db[settings.FAQ_COLLECTION].drop_index("question_hash_1")
+            await self.db[settings.FAQ_COLLECTION].create_index(
+                [("tenant_id", 1), ("question_hash", 1)], unique=True,
+                partialFilterExpression={"question_hash": {"$exists": True}}
+            )
             
             # Conversations Collection indexes
-            await self.db[settings.CONVERSATIONS_COLLECTION].create_index([("session_id", 1)])
-            await self.db[settings.CONVERSATIONS_COLLECTION].create_index([("timestamp", -1)])
-            await self.db[settings.CONVERSATIONS_COLLECTION].create_index([("detected_language", 1)])
+            await self.apply_conversation_index_plan()
+            
+            # Archived daily rollups of expired conversations
+            await self.db[settings.CONVERSATION_ARCHIVE_COLLECTION].create_index([("day", -1), ("detected_language", 1)])
+            if settings.ARCHIVE_TTL_DAYS > 0:
+                await self.db[settings.CONVERSATION_ARCHIVE_COLLECTION].create_index(
+                    [("archived_at", 1)], name="archive_ttl", expireAfterSeconds=settings.ARCHIVE_TTL_DAYS * 86400
+                )
             
             # Users Collection indexes
             await self.db[settings.USERS_COLLECTION].create_index([("user_id", 1)], unique=True)
@@ -53,6 +138,55 @@ class Database:
         except Exception as e:
             logger.error(f"Error creating indexes: {e}")
 
+    async def apply_conversation_index_plan(self):
+        """Create the planned conversation indexes and drop, by name, the ones the plan replaces.
+        
+        Indexes created by operators are left alone. Every worker runs this at startup, so a
+        drop another worker already made is not an error.
+        """
+        from pymongo.errors import OperationFailure
+        collection = self.db[settings.CONVERSATIONS_COLLECTION]
+        planned = dict(CONVERSATION_INDEXES)
+        replaced = list(REPLACED_CONVERSATION_INDEXES)
+        if settings.CONVERSATION_RETENTION_MODE == "ttl":
+            # TTL indexes must be single-field
+            planned["timestamp_ttl"] = [("timestamp", 1)]
+        else:
+            replaced.append("timestamp_ttl")  # retention switched away from ttl
+        
+        async def drop(name: str):
+            try:
+                await collection.drop_index(name)
+                logger.info(f"Dropped conversation index {name}")
+            except OperationFailure as e:
+                if e.code != 27:  # IndexNotFound: dropped by another worker
+                    raise
+        
+        existing = await collection.index_information()
+        for name in replaced:
+            if name in existing:
+                await drop(name)
+        
+        for name, keys in planned.items():
+            options = {}
+            if name == "timestamp_ttl":
+                options["expireAfterSeconds"] = conversation_retention_days() * 86400
+            if name in existing and (list(existing[name]["key"]) != keys or existing[name].get("expireAfterSeconds") != options.get("expireAfterSeconds")):
+                await drop(name)
+            await collection.create_index(keys, name=name, **options)
+
+    async def explain_find(
+        self, collection: str, query: Dict[str, Any], projection: Optional[Dict[str, int]] = None,
+        sort: Optional[List[Tuple[str, int]]] = None, limit: int = 0
+    ) -> Dict[str, Any]:
+        """queryPlanner output for a find, as the server would run it"""
+        cursor = self.db[collection].find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.explain()
+
     async def close(self):
         """Close database connection"""
         if self.client:
@@ -74,7 +208,19 @@ class Database:
             faqs.append(FAQ(**doc))
         return faqs
 
-    async def search_faqs(self, category: Optional[str] = None, keywords: Optional[List[str]] = None) -> List[FAQ]:
+    async def iter_faq_records(self, active_only: bool = True,
+                               tenant_id: Optional[str] = settings.DEFAULT_TENANT) -> AsyncIterator[FAQRecord]:
+        """Stream projected FAQ records of a tenant (every tenant with None) without building pydantic models"""
+        query = {"is_active": True} if active_only else {}
+        if tenant_id is not None:
+            query.update(tenant_filter(tenant_id))
+        cursor = self.db[settings.FAQ_COLLECTION].find(
+            query, FAQ_RECORD_PROJECTION, batch_size=settings.FAQ_CURSOR_BATCH_SIZE
+        )
+        async for doc in cursor:
+            yield FAQRecord.from_document(doc)
+
+    async def search_faqs(self, category: Optional[str] = None, keywords: Optional[List[str]] = None) -> List[FAQRecord]:
         """Search FAQs by category or keywords"""
         query = {"is_active": True}
         
@@ -84,11 +230,75 @@ class Database:
         if keywords:
             query["keywords"] = {"$in": keywords}
         
-        cursor = self.db[settings.FAQ_COLLECTION].find(query)
-        faqs = []
-        async for doc in cursor:
-            faqs.append(FAQ(**doc))
-        return faqs
+        cursor = self.db[settings.FAQ_COLLECTION].find(
+            query, FAQ_RECORD_PROJECTION, batch_size=settings.FAQ_CURSOR_BATCH_SIZE
+        )
+        return [FAQRecord.from_document(doc) async for doc in cursor]
+
+    async def get_faq_records(self, faq_ids: List[str]) -> List[FAQRecord]:
+        """Projected records of the given FAQs"""
+        cursor = self.db[settings.FAQ_COLLECTION].find(
+            {"_id": {"$in": [ObjectId(faq_id) for faq_id in faq_ids]}, "is_active": True}, FAQ_RECORD_PROJECTION
+        )
+        return [FAQRecord.from_document(doc) async for doc in cursor]
+
+    async def set_faq_translations(self, translations: Dict[str, Dict[str, Dict[str, str]]]) -> int:
+        """Set languages.<lang> entries of many FAQs in one bulk write ({faq_id: {lang: content}})"""
+        from pymongo import UpdateOne
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(faq_id)},
+                {"$set": {f"languages.{lang}": content for lang, content in languages.items()}},
+            )
+            for faq_id, languages in translations.items()
+            if languages
+        ]
+        if not operations:
+            return 0
+        result = await self.db[settings.FAQ_COLLECTION].bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    async def get_faq_hashes(self, question_hashes: List[str], tenant_id: str = settings.DEFAULT_TENANT) -> Dict[str, Dict[str, Any]]:
+        """Map question_hash -> {_id, content_hash, is_active} for a tenant's FAQs that already exist, deleted or not"""
+        cursor = self.db[settings.FAQ_COLLECTION].find(
+            {**tenant_filter(tenant_id), "question_hash": {"$in": question_hashes}},
+            {"question_hash": 1, "content_hash": 1, "is_active": 1}
+        )
+        return {doc["question_hash"]: doc async for doc in cursor}
+
+    async def upsert_faqs(self, faqs: List[Dict[str, Any]], tenant_id: str = settings.DEFAULT_TENANT) -> Dict[int, Any]:
+        """Upsert a tenant's FAQs keyed by question_hash in one bulk write; returns {position: _id} of inserted FAQs.
+        
+        The (tenant_id, question_hash) unique index decides between insert and update, so a
+        question inserted concurrently by another writer is updated rather than duplicated.
+        Every upserted FAQ is (re)activated.
+        """
+        from datetime import datetime
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+        now = datetime.now()
+        operations = [
+            UpdateOne(
+                {**tenant_filter(tenant_id), "question_hash": faq["question_hash"]},
+                {
+                    "$set": {**faq, "tenant_id": tenant_id, "updated_at": now, "is_active": True},
+                    "$setOnInsert": {"created_at": now, "priority": 1},
+                },
+                upsert=True,
+            )
+            for faq in faqs
+        ]
+        collection = self.db[settings.FAQ_COLLECTION]
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            return result.upserted_ids
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(error["code"] != 11000 for error in errors):
+                raise
+            # Lost an insert race on the unique index: the question exists now, so the retry updates it
+            await collection.bulk_write([operations[error["index"]] for error in errors], ordered=False)
+            return {upsert["index"]: upsert["_id"] for upsert in e.details["upserted"]}
 
     async def update_faq(self, faq_id: str, update_data: Dict[str, Any]) -> bool:
         """Update an FAQ"""
@@ -114,30 +324,115 @@ class Database:
         )
         return str(result.inserted_id)
 
-    async def get_conversation_history(self, session_id: str, limit: int = 10) -> List[ConversationLog]:
-        """Get conversation history for a session"""
+    async def _page_conversations(
+        self, query: Dict[str, Any], projection: Dict[str, int], limit: int, page_token: Optional[str]
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Newest-first keyset page over conversations; returns (docs, next page token)"""
+        limit = max(1, min(limit, settings.MAX_PAGE_SIZE))
+        if page_token:
+            timestamp, last_id = decode_page_token(page_token)
+            query = {
+                **query,
+                "$or": [
+                    {"timestamp": {"$lt": timestamp}},
+                    {"timestamp": timestamp, "_id": {"$lt": last_id}},
+                ],
+            }
+        
+        # Fetch one extra document to learn whether another page exists
         cursor = self.db[settings.CONVERSATIONS_COLLECTION].find(
-            {"session_id": session_id}
-        ).sort("timestamp", -1).limit(limit)
+            query, projection
+        ).sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1)
+        docs = await cursor.to_list(limit + 1)
         
-        conversations = []
-        async for doc in cursor:
-            conversations.append(ConversationLog(**doc))
-        return conversations
+        next_token = encode_page_token(docs[limit - 1]) if len(docs) > limit else None
+        return docs[:limit], next_token
 
-    async def get_recent_conversations(self, hours: int = 24) -> List[ConversationLog]:
-        """Get recent conversations"""
-        from datetime import datetime, timedelta
+    async def get_conversation_history(
+        self, session_id: str, limit: int = 10, page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get a page of conversation history for a session, newest first"""
+        return await self._page_conversations(
+            {"session_id": session_id}, CONVERSATION_HISTORY_PROJECTION, limit, page_token
+        )
+
+    async def get_recent_conversations(
+        self, hours: int = 24, limit: int = 50, page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get a page of recent conversations, newest first"""
+        from datetime import timedelta
         cutoff_time = datetime.now() - timedelta(hours=hours)
         
-        cursor = self.db[settings.CONVERSATIONS_COLLECTION].find(
-            {"timestamp": {"$gte": cutoff_time}}
-        ).sort("timestamp", -1)
-        
-        conversations = []
-        async for doc in cursor:
-            conversations.append(ConversationLog(**doc))
-        return conversations
+        return await self._page_conversations(
+            {"timestamp": {"$gte": cutoff_time}}, RECENT_CONVERSATION_PROJECTION, limit, page_token
+        )
+
+    async def oldest_conversation_before(self, cutoff: datetime) -> Optional[datetime]:
+        """Timestamp of the oldest conversation older than cutoff, if any"""
+        doc = await self.db[settings.CONVERSATIONS_COLLECTION].find_one(
+            {"timestamp": {"$lt": cutoff}}, {"timestamp": 1}, sort=[("timestamp", 1)]
+        )
+        return doc["timestamp"] if doc else None
+
+    async def archive_conversation_day(self, day: datetime) -> int:
+        """Roll one day of conversations up into the archive, then delete them; returns conversations archived"""
+        from datetime import timedelta
+        collection = self.db[settings.CONVERSATIONS_COLLECTION]
+        window = {"timestamp": {"$gte": day, "$lt": day + timedelta(days=1)}}
+        pipeline = [
+            {"$match": window},
+            {
+                "$group": {
+                    "_id": {
+                        "day": {"$literal": day},
+                        "language": "$detected_language",
+                        "category": "$category",
+                        "faq_id": "$faq_id",
+                    },
+                    "conversations": {"$sum": 1},
+                    "sessions": {"$addToSet": "$session_id"},
+                    "fallbacks": {"$sum": {"$cond": ["$fallback_triggered", 1, 0]}},
+                    "confidence_sum": {"$sum": "$confidence"},
+                    "response_time_ms_sum": {"$sum": "$response_time_ms"},
+                }
+            },
+            {
+                "$project": {
+                    "day": "$_id.day",
+                    "detected_language": "$_id.language",
+                    "category": "$_id.category",
+                    "faq_id": "$_id.faq_id",
+                    "conversations": 1,
+                    "unique_sessions": {"$size": "$sessions"},
+                    "fallbacks": 1,
+                    "confidence_sum": 1,
+                    "response_time_ms_sum": 1,
+                    "archived_at": "$$NOW",
+                }
+            },
+            # A whole day is rolled up at once, so a re-run after a failed delete replaces rather than double counts
+            {"$merge": {"into": settings.CONVERSATION_ARCHIVE_COLLECTION, "on": "_id", "whenMatched": "replace"}},
+        ]
+        await collection.aggregate(pipeline).to_list(None)
+        result = await collection.delete_many(window)
+        return result.deleted_count
+
+    async def aggregate_faq_demand(self, since: datetime) -> List[Dict[str, Any]]:
+        """Answered conversations since a date, counted per (faq_id, language, day)"""
+        pipeline = [
+            {"$match": {"timestamp": {"$gte": since}, "faq_id": {"$ne": None}, "fallback_triggered": False}},
+            {
+                "$group": {
+                    "_id": {
+                        "faq_id": "$faq_id",
+                        "language": "$detected_language",
+                        "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                    },
+                    "count": {"$sum": 1},
+                }
+            },
+        ]
+        return await self.db[settings.CONVERSATIONS_COLLECTION].aggregate(pipeline).to_list(None)
 
     # User Operations
     async def create_or_update_user(self, user: User) -> str:
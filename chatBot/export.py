@@ -0,0 +1,175 @@
+"""Streaming export of conversation logs and feedback.
+
+Documents are read straight from a Motor cursor and written out in
+chunks, as NDJSON (over HTTP or to a file) or as Parquet row groups, so
+exporting months of logs uses bounded memory. Parquet needs the optional
+pyarrow package.
+
+Usage:
+    python export.py conversations --since 2025-01-01 --until 2025-04-01 --language hi --out conversations.ndjson
+    python export.py feedback --format parquet --out feedback.parquet
+"""
+import argparse
+import asyncio
+import json
+import logging
+import typing
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from config import settings
+from database import db
+from model import ConversationLog, Feedback
+
+logger = logging.getLogger(__name__)
+
+# Export kind -> (collection, model describing its documents)
+EXPORT_KINDS = {
+    "conversations": (settings.CONVERSATIONS_COLLECTION, ConversationLog),
+    "feedback": (settings.FEEDBACK_COLLECTION, Feedback),
+}
+
+
+def build_export_query(kind: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       language: Optional[str] = None) -> Dict[str, Any]:
+    """Mongo filter for an export; raises ValueError for unsupported combinations"""
+    if kind not in EXPORT_KINDS:
+        raise ValueError(f"Unknown export kind: {kind}")
+
+    query: Dict[str, Any] = {}
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = since
+        if until:
+            query["timestamp"]["$lt"] = until
+
+    if language:
+        if kind != "conversations":
+            raise ValueError("Language filter only applies to conversation exports")
+        query["detected_language"] = language
+    return query
+
+
+async def iter_export_documents(kind: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                                language: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+    """Stream exported documents oldest first, with _id flattened to a string id"""
+    collection, _ = EXPORT_KINDS[kind]
+    query = build_export_query(kind, since, until, language)
+    cursor = db.db[collection].find(query, batch_size=settings.EXPORT_BATCH_SIZE).sort("timestamp", 1)
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        yield doc
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def iter_ndjson(kind: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                      language: Optional[str] = None) -> AsyncIterator[bytes]:
+    """NDJSON export in chunks of EXPORT_BATCH_SIZE lines"""
+    lines: List[str] = []
+    async for doc in iter_export_documents(kind, since, until, language):
+        lines.append(json.dumps(doc, default=_json_default, ensure_ascii=False))
+        if len(lines) >= settings.EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _arrow_schema(kind: str):
+    """Parquet schema derived from the pydantic model of the exported documents"""
+    import pyarrow as pa
+
+    _, model = EXPORT_KINDS[kind]
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_(), datetime: pa.timestamp("ms")}
+    fields = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if typing.get_origin(annotation) is typing.Union:
+            annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+        fields.append(pa.field(name, types.get(annotation, pa.string())))
+    return pa.schema(fields)
+
+
+async def write_parquet(kind: str, path: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        language: Optional[str] = None) -> int:
+    """Write an export as Parquet, one row group per EXPORT_ROW_GROUP_SIZE documents; returns the row count"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+
+    schema = _arrow_schema(kind)
+    loop = asyncio.get_event_loop()
+    writer = pq.ParquetWriter(path, schema)
+    rows = 0
+    try:
+        batch: List[Dict[str, Any]] = []
+
+        async def flush():
+            table = pa.Table.from_pylist(
+                [{name: doc.get(name) for name in schema.names} for doc in batch],
+                schema=schema,
+            )
+            # Encoding and compression run off the event loop
+            await loop.run_in_executor(None, writer.write_table, table)
+
+        async for doc in iter_export_documents(kind, since, until, language):
+            batch.append(doc)
+            if len(batch) >= settings.EXPORT_ROW_GROUP_SIZE:
+                await flush()
+                rows += len(batch)
+                batch = []
+        if batch:
+            await flush()
+            rows += len(batch)
+    finally:
+        writer.close()
+    return rows
+
+
+async def write_ndjson(kind: str, path: str, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       language: Optional[str] = None) -> int:
+    """Write an NDJSON export to a file; returns the row count"""
+    rows = 0
+    with open(path, "wb") as output:
+        async for chunk in iter_ndjson(kind, since, until, language):
+            output.write(chunk)
+            rows += chunk.count(b"\n")
+    return rows
+
+
+async def run_export(args: argparse.Namespace):
+    await db.connect()
+    try:
+        writer = write_parquet if args.format == "parquet" else write_ndjson
+        start = datetime.now()
+        rows = await writer(args.kind, args.out, args.since, args.until, args.language)
+        elapsed = (datetime.now() - start).total_seconds()
+        logger.info(f"Exported {rows} {args.kind} documents to {args.out} in {elapsed:.1f}s")
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kind", choices=sorted(EXPORT_KINDS))
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Inclusive start (ISO date/time)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Exclusive end (ISO date/time)")
+    parser.add_argument("--language", help="Only conversations in this detected language")
+    parser.add_argument("--format", choices=["ndjson", "parquet"], default="ndjson")
+    parser.add_argument("--out", required=True, help="Output file path")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_export(args))
+
+
+if __name__ == "__main__":
+    main()
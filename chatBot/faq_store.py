@@ -0,0 +1,197 @@
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from model import FAQ, FAQRecord
+
+
+class FAQEntry:
+    """View of one FAQ row in a store; what matching returns in place of a full FAQ model"""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store: "FAQStore", row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.store.ids[self.row]
+
+    @property
+    def category(self) -> str:
+        return self.store.category(self.row)
+
+    @property
+    def question(self) -> str:
+        return self.store.questions["en"][self.row]
+
+    @property
+    def answer(self) -> str:
+        return self.store.answers["en"][self.row]
+
+    def question_in(self, language: str) -> Optional[str]:
+        return self.store.question(self.row, language)
+
+    def answer_in(self, language: str) -> Optional[str]:
+        return self.store.answer(self.row, language)
+
+
+class FAQStoreBuilder:
+    """Accumulates FAQs row by row (e.g. from a cursor) and freezes them into an FAQStore"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.category_names: List[str] = []
+        self.category_lookup: Dict[str, int] = {}
+        self.category_ids = array("H")
+        self.keywords: List[Tuple[str, ...]] = []
+        self.questions: Dict[str, List[Optional[str]]] = {"en": []}
+        self.answers: Dict[str, List[Optional[str]]] = {"en": []}
+        self.object_bytes = 0  # strings and keyword tuples appended so far
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _column(self, columns: Dict[str, List[Optional[str]]], language: str) -> List[Optional[str]]:
+        if language not in columns:
+            # Backfill rows added before this language first appeared
+            columns[language] = [None] * len(self.ids)
+        return columns[language]
+
+    def append(self, faq: Union[FAQ, FAQRecord]) -> int:
+        """Add an FAQ and return its row number"""
+        row = len(self.ids)
+        category = sys.intern(faq.category or "")
+        if category not in self.category_lookup:
+            self.category_lookup[category] = len(self.category_names)
+            self.category_names.append(category)
+
+        self.ids.append(str(faq.id))
+        self.category_ids.append(self.category_lookup[category])
+        self.keywords.append(tuple(sys.intern(keyword) for keyword in faq.keywords))
+        for columns in (self.questions, self.answers):
+            for column in columns.values():
+                column.append(None)
+
+        self.questions["en"][row] = faq.question
+        self.answers["en"][row] = faq.answer
+        self.object_bytes += sum(map(sys.getsizeof, (self.ids[row], faq.question, faq.answer, self.keywords[row])))
+        for lang, content in faq.languages.items():
+            if content.get('question'):
+                self._column(self.questions, lang)[row] = content['question']
+                self.object_bytes += sys.getsizeof(content['question'])
+            if content.get('answer'):
+                self._column(self.answers, lang)[row] = content['answer']
+                self.object_bytes += sys.getsizeof(content['answer'])
+        return row
+
+    def build(self) -> "FAQStore":
+        category_rows: Dict[str, List[int]] = {}
+        for row, category_id in enumerate(self.category_ids):
+            category_rows.setdefault(self.category_names[category_id], []).append(row)
+
+        return FAQStore(
+            ids=tuple(self.ids),
+            category_names=tuple(self.category_names),
+            category_ids=self.category_ids,
+            keywords=tuple(self.keywords),
+            questions={lang: tuple(column) for lang, column in self.questions.items()},
+            answers={lang: tuple(column) for lang, column in self.answers.items()},
+            category_rows={category: tuple(rows) for category, rows in category_rows.items()},
+            # Column, id and category row tuples hold one 8-byte pointer per row each
+            nbytes=(
+                self.object_bytes
+                + 8 * len(self.ids) * (3 + len(self.questions) + len(self.answers))
+                + self.category_ids.itemsize * len(self.category_ids)
+            ),
+        )
+
+
+class FAQStore:
+    """Immutable, column-oriented FAQ catalogue.
+
+    Categories are interned and stored as small integer ids, questions and
+    answers are parallel per-language columns (None where a translation is
+    missing), and rows are pre-grouped by category. Lookups by (row, language)
+    are O(1).
+    """
+
+    __slots__ = ("ids", "category_names", "category_ids", "keywords", "questions", "answers", "category_rows", "nbytes")
+
+    def __init__(
+        self,
+        ids: Tuple[str, ...] = (),
+        category_names: Tuple[str, ...] = (),
+        category_ids: array = None,
+        keywords: Tuple[Tuple[str, ...], ...] = (),
+        questions: Dict[str, Tuple[Optional[str], ...]] = None,
+        answers: Dict[str, Tuple[Optional[str], ...]] = None,
+        category_rows: Dict[str, Tuple[int, ...]] = None,
+        nbytes: int = 0,
+    ):
+        self.ids = ids
+        self.category_names = category_names
+        self.category_ids = category_ids if category_ids is not None else array("H")
+        self.keywords = keywords
+        self.questions = questions or {"en": ()}
+        self.answers = answers or {"en": ()}
+        self.category_rows = category_rows or {}
+        self.nbytes = nbytes  # estimated when built, so memory reports never walk the columns
+
+    @classmethod
+    def from_faqs(cls, faqs) -> "FAQStore":
+        builder = FAQStoreBuilder()
+        for faq in faqs:
+            builder.append(faq)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def entry(self, row: int) -> FAQEntry:
+        return FAQEntry(self, row)
+
+    def category(self, row: int) -> str:
+        return self.category_names[self.category_ids[row]]
+
+    def rows_in_category(self, category: Optional[str] = None) -> Tuple[int, ...]:
+        """Rows of a category, or every row when category is empty"""
+        if not category:
+            return tuple(range(len(self.ids)))
+        return self.category_rows.get(category, ())
+
+    def question(self, row: int, language: str) -> Optional[str]:
+        column = self.questions.get(language)
+        return column[row] if column is not None else None
+
+    def answer(self, row: int, language: str) -> Optional[str]:
+        column = self.answers.get(language)
+        return column[row] if column is not None else None
+
+    def search_texts(self, row: int) -> List[str]:
+        """Keywords plus every question variant, the document the lexical index sees"""
+        return [*self.keywords[row], *(column[row] for column in self.questions.values() if column[row])]
+
+    def records(self) -> Iterator[FAQRecord]:
+        """Reconstruct lightweight records, e.g. to rebuild the store with changes"""
+        for row, faq_id in enumerate(self.ids):
+            languages = {}
+            for lang in set(self.questions) | set(self.answers):
+                if lang == "en":
+                    continue
+                content = {}
+                if self.question(row, lang):
+                    content['question'] = self.question(row, lang)
+                if self.answer(row, lang):
+                    content['answer'] = self.answer(row, lang)
+                if content:
+                    languages[lang] = content
+            yield FAQRecord(
+                id=faq_id,
+                question=self.questions["en"][row],
+                answer=self.answers["en"][row],
+                keywords=list(self.keywords[row]),
+                category=self.category(row),
+                languages=languages,
+            )
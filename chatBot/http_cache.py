@@ -0,0 +1,144 @@
+"""HTTP caching for read-mostly GET endpoints.
+
+Each cached path has a policy: a Cache-Control max-age and a function
+returning the current version of the data behind it (FAQ index snapshot
+version, popularity refresh, stats rollup period, ...). The version is the
+ETag, so a matching If-None-Match is answered with 304 before the endpoint
+runs. Error responses are never cached. Rendered 200 bodies are kept server-side per (path, query, version)
+for max-age seconds, so repeated requests skip the endpoint as well.
+"""
+import hashlib
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class CachePolicy(NamedTuple):
+    max_age: int  # Seconds clients and the server-side cache may reuse a body
+    version: Callable[[], str]  # Changes whenever the response content may change
+    private: bool = False  # Cache-Control private (per-user dashboards) instead of public
+
+
+class CachedBody(NamedTuple):
+    etag: str
+    headers: List[Tuple[bytes, bytes]]
+    body: bytes
+    expires_at: float
+
+
+def make_etag(path: str, query: str, version: str) -> str:
+    return '"' + hashlib.sha1(f"{path}?{query}:{version}".encode()).hexdigest()[:16] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag in candidates
+
+
+class ResponseCache:
+    """TTL cache of rendered response bodies, least recently used evicted past max_entries"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Tuple[str, str, str], CachedBody]" = OrderedDict()
+        self.counters = Counter()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[CachedBody]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[str, str, str], entry: CachedBody):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "bytes": sum(len(entry.body) for entry in self.entries.values()),
+            **self.counters,
+        }
+
+
+class HTTPCacheMiddleware:
+    """ASGI middleware adding ETag/Cache-Control, 304 revalidation and a body cache to the configured paths"""
+
+    def __init__(self, app: ASGIApp, policies: Dict[str, CachePolicy], cache: ResponseCache):
+        self.app = app
+        self.policies = policies
+        self.cache = cache
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        policy = self.policies.get(scope.get("path")) if scope["type"] == "http" else None
+        if policy is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        query = scope.get("query_string", b"").decode("latin-1")
+        version = policy.version()
+        etag = make_etag(path, query, version)
+        cache_control = f"{'private' if policy.private else 'public'}, max-age={policy.max_age}"
+        headers = dict(scope["headers"])
+
+        if_none_match = headers.get(b"if-none-match")
+        if if_none_match and etag_matches(if_none_match.decode("latin-1"), etag):
+            self.cache.counters["not_modified"] += 1
+            await self._send(send, 304, [], b"", etag, cache_control)
+            return
+
+        key = (path, query, version)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.counters["hits"] += 1
+            await self._send(send, 200, entry.headers, entry.body, etag, cache_control)
+            return
+        self.cache.counters["misses"] += 1
+
+        start: Dict[str, Any] = {}
+        chunks: List[bytes] = []
+
+        async def capture(message: Message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        status = start.get("status", 500)
+        response_headers = [
+            (name, value) for name, value in start.get("headers", [])
+            if name.lower() not in (b"etag", b"cache-control")
+        ]
+        body = b"".join(chunks)
+        if status == 200:
+            kept_headers = [(name, value) for name, value in response_headers if name.lower() != b"content-length"]
+            self.cache.put(key, CachedBody(etag, kept_headers, body, time.monotonic() + policy.max_age))
+            await self._send(send, status, kept_headers, body, etag, cache_control)
+        else:
+            # Errors are passed through uncached and without validators
+            await send({"type": "http.response.start", "status": status, "headers": response_headers})
+            await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send(send: Send, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, etag: str, cache_control: str):
+        headers = headers + [
+            (b"etag", etag.encode("latin-1")),
+            (b"cache-control", cache_control.encode("latin-1")),
+        ]
+        if status != 304:
+            headers.append((b"content-length", str(len(body)).encode("latin-1")))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
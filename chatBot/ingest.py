@@ -0,0 +1,212 @@
+"""Bulk FAQ ingestion from CSV or JSONL.
+
+Rows are validated in bulk, deduplicated by a hash of the normalized
+English question, and upserted with one bulk write per batch. Only new
+or changed FAQs are written, and when the NLP service is running in this
+process their questions are encoded straight into the live index.
+
+CSV columns: question, answer, category, keywords (separated by ";"),
+plus optional question_<lang> / answer_<lang> pairs (e.g. question_hi).
+JSONL lines follow the FAQRequest shape.
+
+Usage:
+    python ingest.py department_faqs.csv
+    python ingest.py department_faqs.jsonl --dry-run
+    python ingest.py north_campus_faqs.csv --tenant north
+
+The CLI only writes to the database; a running server picks the changes
+up on its next FAQ refresh (run materialize.py to translate them). Use
+POST /admin/faqs/ingest to update a live index directly.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import logging
+import time
+from typing import Any, Dict, Iterator, List
+
+from pydantic import TypeAdapter, ValidationError
+
+from config import settings
+from database import db
+from lexical import normalize_text
+from model import FAQRecord, FAQRequest, IngestReport
+from nlp import nlp_service
+from materialize import translation_materializer
+from tenants import tenant_registry
+
+logger = logging.getLogger(__name__)
+
+MAX_REPORTED_ERRORS = 50
+
+faq_batch_adapter = TypeAdapter(List[FAQRequest])
+
+
+def question_hash(question: str) -> str:
+    return hashlib.sha1(normalize_text(question).encode("utf-8")).hexdigest()
+
+
+def content_hash(faq: FAQRequest) -> str:
+    return hashlib.sha1(json.dumps(faq.model_dump(), sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def parse_rows(content: str, file_format: str) -> Iterator[Dict[str, Any]]:
+    """Yield raw FAQ dicts from CSV or JSONL text"""
+    if file_format == "jsonl":
+        for line in content.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    for row in csv.DictReader(io.StringIO(content)):
+        languages: Dict[str, Dict[str, str]] = {}
+        for column, value in row.items():
+            if not value or "_" not in column:
+                continue
+            field, lang = column.rsplit("_", 1)
+            if field in ("question", "answer"):
+                languages.setdefault(lang, {})[field] = value.strip()
+
+        yield {
+            "question": (row.get("question") or "").strip(),
+            "answer": (row.get("answer") or "").strip(),
+            "category": (row.get("category") or "").strip(),
+            "keywords": [keyword.strip() for keyword in (row.get("keywords") or "").split(";") if keyword.strip()],
+            "languages": languages,
+        }
+
+
+def _record_error(report: IngestReport, line: int, error: Exception):
+    report.invalid_rows += 1
+    if len(report.errors) < MAX_REPORTED_ERRORS:
+        report.errors.append(f"row {line}: {error}")
+
+
+def validate_batch(rows: List[Dict[str, Any]], first_line: int, report: IngestReport) -> List[FAQRequest]:
+    """Validate a batch in one pass, falling back to per-row validation to isolate bad rows"""
+    try:
+        faqs = faq_batch_adapter.validate_python(rows)
+    except ValidationError:
+        faqs = []
+        for offset, row in enumerate(rows):
+            try:
+                faqs.append(FAQRequest.model_validate(row))
+            except ValidationError as e:
+                _record_error(report, first_line + offset, e)
+                faqs.append(None)
+
+    valid = []
+    for offset, faq in enumerate(faqs):
+        if faq is None:
+            continue
+        if not faq.question.strip() or not faq.answer.strip():
+            _record_error(report, first_line + offset, ValueError("question and answer are required"))
+            continue
+        valid.append(faq)
+    return valid
+
+
+async def ingest_faqs(content: str, file_format: str, dry_run: bool = False, update_index: bool = True,
+                      tenant_id: str = settings.DEFAULT_TENANT) -> IngestReport:
+    """Validate, deduplicate, upsert and (optionally) index a file of a tenant's FAQs"""
+    report = IngestReport()
+    start = time.perf_counter()
+
+    # Validate in batches and deduplicate; later rows override earlier ones
+    unique: Dict[str, FAQRequest] = {}
+    batch: List[Dict[str, Any]] = []
+    for row in parse_rows(content, file_format):
+        report.rows_read += 1
+        batch.append(row)
+        if len(batch) >= settings.INGEST_BATCH_SIZE:
+            for faq in validate_batch(batch, report.rows_read - len(batch) + 1, report):
+                unique[question_hash(faq.question)] = faq
+            batch = []
+    if batch:
+        for faq in validate_batch(batch, report.rows_read - len(batch) + 1, report):
+            unique[question_hash(faq.question)] = faq
+    report.duplicate_rows = report.rows_read - report.invalid_rows - len(unique)
+
+    # Upsert only new or changed FAQs, one bulk write per batch
+    changed_records: List[FAQRecord] = []
+    hashes = list(unique)
+    for start_idx in range(0, len(hashes), settings.INGEST_BATCH_SIZE):
+        chunk = hashes[start_idx:start_idx + settings.INGEST_BATCH_SIZE]
+        existing = await db.get_faq_hashes(chunk, tenant_id)
+
+        documents = []
+        for key in chunk:
+            faq = unique[key]
+            digest = content_hash(faq)
+            # A deleted FAQ that is ingested again is reactivated, even if its content is unchanged
+            if key in existing and existing[key].get("content_hash") == digest and existing[key].get("is_active", True):
+                report.unchanged += 1
+                continue
+            documents.append({**faq.model_dump(), "question_hash": key, "content_hash": digest})
+
+        inserted = {position for position, document in enumerate(documents) if document["question_hash"] not in existing}
+        if documents and not dry_run:
+            inserted_ids = await db.upsert_faqs(documents, tenant_id)
+            inserted = set(inserted_ids)
+            # Questions another writer inserted after the pre-read were updated; look up their ids
+            raced = [
+                document["question_hash"] for position, document in enumerate(documents)
+                if position not in inserted_ids and document["question_hash"] not in existing
+            ]
+            if raced:
+                existing.update(await db.get_faq_hashes(raced, tenant_id))
+            for position, document in enumerate(documents):
+                faq_id = inserted_ids.get(position) or existing[document["question_hash"]]["_id"]
+                changed_records.append(FAQRecord.from_document({**document, "_id": faq_id, "tenant_id": tenant_id}))
+
+        report.inserted += len(inserted)
+        report.updated += len(documents) - len(inserted)
+
+        done = min(start_idx + settings.INGEST_BATCH_SIZE, len(hashes))
+        elapsed = time.perf_counter() - start
+        logger.info(f"Ingested {done}/{len(hashes)} unique FAQs ({done / elapsed:.0f} FAQs/s)")
+
+    if changed_records and update_index and nlp_service.is_initialized:
+        report.questions_encoded = await tenant_registry.apply_faq_changes(tenant_id, changed_records)
+        # Fill in the other supported languages in the background
+        translation_materializer.schedule(record.id for record in changed_records)
+
+    report.elapsed_seconds = round(time.perf_counter() - start, 3)
+    report.rows_per_second = round(report.rows_read / report.elapsed_seconds, 1) if report.elapsed_seconds else 0.0
+    logger.info(
+        f"Ingestion finished: {report.rows_read} rows, {report.inserted} inserted, {report.updated} updated, "
+        f"{report.unchanged} unchanged, {report.duplicate_rows} duplicates, {report.invalid_rows} invalid, "
+        f"{report.questions_encoded} questions encoded in {report.elapsed_seconds}s"
+    )
+    return report
+
+
+async def run_ingest(args: argparse.Namespace):
+    await db.connect()
+    try:
+        with open(args.path, encoding="utf-8-sig") as source:
+            content = source.read()
+        file_format = args.format or ("jsonl" if args.path.endswith((".jsonl", ".ndjson")) else "csv")
+        report = await ingest_faqs(content, file_format, dry_run=args.dry_run, update_index=False, tenant_id=args.tenant)
+        print(report.model_dump_json(indent=2))
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or JSONL file of FAQs")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and diff without writing")
+    parser.add_argument("--tenant", default=settings.DEFAULT_TENANT, help="Tenant (campus) the FAQs belong to")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_ingest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import math
+import re
+import sys
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+# Word characters plus the Indic script blocks (vowel signs are not matched by \w),
+# excluding the danda/double danda sentence separators
+TOKEN_PATTERN = re.compile(r"[\w\u0900-\u0963\u0966-\u0DFF]+")
+
+# Approximate CPython sizes, to estimate index memory from entry counts
+POSTING_BYTES = 56 + 8 + 28  # (doc index, frequency) tuple, its list slot and the doc index int
+TERM_BYTES = 2 * 50 + 24 + 56  # postings and idf dict entries, the idf float and the posting list header
+DOC_BYTES = 8 + 28  # doc length slot and int
+
+STOP_WORDS = {'is', 'are', 'was', 'were', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'what', 'when', 'where', 'how', 'why', 'who'}
+
+
+def normalize_text(text: str) -> str:
+    """Case-, punctuation- and whitespace-insensitive form of a text, used as a dedup key"""
+    return " ".join(TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text).lower()))
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into index terms, dropping stop words"""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index over FAQ documents.
+
+    Each document is the concatenation of an FAQ's keywords and its questions
+    in every language. Besides the BM25 score, search reports a confidence in
+    [0, 1]: the idf-weighted share of query terms the document contains.
+    """
+
+    def __init__(self, documents: Sequence[Sequence[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}  # term -> [(doc index, term frequency)]
+        self.doc_lengths: List[int] = []
+
+        for doc_idx, texts in enumerate(documents):
+            terms = Counter()
+            for text in texts:
+                terms.update(tokenize(text))
+            self.doc_lengths.append(sum(terms.values()))
+            for term, freq in terms.items():
+                self.postings.setdefault(term, []).append((doc_idx, freq))
+
+        self.doc_count = len(self.doc_lengths)
+        self.avg_doc_length = (sum(self.doc_lengths) / self.doc_count) if self.doc_count else 0.0
+        self.idf = {
+            term: math.log(1 + (self.doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+        # Unseen query terms weigh as much as the rarest indexed term
+        self.max_idf = math.log(1 + (self.doc_count + 0.5) / 0.5) if self.doc_count else 0.0
+        # Estimated once here, so memory reports never walk the postings
+        self.nbytes = (
+            sum(len(posting) for posting in self.postings.values()) * POSTING_BYTES
+            + sum(sys.getsizeof(term) + TERM_BYTES for term in self.postings)
+            + self.doc_count * DOC_BYTES
+        )
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float, float]]:
+        """Return up to top_k (doc index, BM25 score, confidence) tuples, best first"""
+        query_terms = set(tokenize(query))
+        if not query_terms or not self.doc_count:
+            return []
+
+        scores: Dict[int, float] = {}
+        matched_weight: Dict[int, float] = {}
+        total_weight = 0.0
+
+        for term in query_terms:
+            idf = self.idf.get(term)
+            if idf is None:
+                total_weight += self.max_idf
+                continue
+            total_weight += idf
+
+            for doc_idx, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_idx] / self.avg_doc_length)
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+                matched_weight[doc_idx] = matched_weight.get(doc_idx, 0.0) + idf
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [
+            (doc_idx, score, matched_weight[doc_idx] / total_weight if total_weight else 0.0)
+            for doc_idx, score in ranked
+        ]
+
+    def confidences(self, query: str) -> Dict[int, float]:
+        """Confidence for every document sharing at least one term with the query"""
+        return {doc_idx: confidence for doc_idx, _, confidence in self.search(query, top_k=self.doc_count)}
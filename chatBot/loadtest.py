@@ -0,0 +1,332 @@
+"""Open-loop load generator with a latency SLO report.
+
+Drives /chat (FAQ hits, greetings and fallbacks in a configurable language
+mix), /popular-questions and /analytics/stats at fixed Poisson arrival
+rates. Requests are sent on schedule whether or not earlier ones finished,
+and latency is measured from the scheduled send time, so a saturated
+server shows up as growing latency rather than a slower generator.
+
+Targets:
+  (default)  the app in-process over ASGI, no network
+  --serve    the app under uvicorn in this process, over localhost HTTP
+  --url      an already running server (no local stack is set up)
+
+The local stack uses an in-memory MongoDB stand-in (pip install
+mongomock-motor) or --mongo-url, the real encoder, and a stub translator
+with a fixed latency. FAQs come from --faqs (CSV/JSONL, as for ingest.py)
+or are generated.
+
+Usage:
+    python loadtest.py --rps 5 10 20 40 --duration 30 --out build_a.json
+    python loadtest.py --faqs department_faqs.csv --languages en=0.5,hi=0.3,ta=0.2 --rps 25
+    python loadtest.py --url http://replica:8000 --rps 50 --mix chat=1
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+GREETINGS = {"en": "Hello", "hi": "नमस्ते", "ta": "வணக்கம்", "te": "నమస్కారం", "kn": "ನಮಸ್ಕಾರ", "mr": "नमस्कार", "gu": "નમસ્તે", "bn": "নমস্কার"}
+
+FALLBACK_QUERIES = [
+    "Can you recommend a good movie for tonight?",
+    "What is the capital of Mongolia?",
+    "My laptop screen flickers when I open the lid",
+    "Write me a poem about the monsoon",
+    "How many moons does Jupiter have?",
+]
+
+SYNTHETIC_TOPICS = {
+    "fees": ["tuition fee", "hostel fee", "exam fee", "late payment fine", "fee refund"],
+    "admissions": ["eligibility", "entrance exam", "application deadline", "document list", "lateral entry"],
+    "academics": ["semester exam schedule", "revaluation process", "attendance rule", "elective choice", "grading system"],
+    "facilities": ["library timing", "hostel allotment", "bus pass", "sports complex", "canteen menu"],
+    "placement": ["placement eligibility", "internship policy", "training sessions", "campus drive dates", "offer letter"],
+}
+SYNTHETIC_PROGRAMS = ["B.Tech", "M.Tech", "MBA", "BCA", "MCA", "B.Sc", "M.Sc", "BBA", "B.Com", "PhD"]
+
+
+class StubTranslator:
+    """Stands in for googletrans: one fixed-latency round trip per call, tagged echo of the text(s)"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    async def translate(self, text, src: str = "auto", dest: str = "en"):
+        await asyncio.sleep(self.latency)
+        if isinstance(text, list):
+            return [SimpleNamespace(text=f"[{dest}] {item}", src=src, dest=dest) for item in text]
+        return SimpleNamespace(text=f"[{dest}] {text}", src=src, dest=dest)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def synthetic_faqs(count: int) -> str:
+    """JSONL of generated English FAQs across the usual categories"""
+    lines = []
+    for i in range(count):
+        category = list(SYNTHETIC_TOPICS)[i % len(SYNTHETIC_TOPICS)]
+        topic = SYNTHETIC_TOPICS[category][(i // len(SYNTHETIC_TOPICS)) % 5]
+        program = SYNTHETIC_PROGRAMS[(i // 25) % len(SYNTHETIC_PROGRAMS)]
+        lines.append(json.dumps({
+            "question": f"What is the {topic} for {program} students (batch {i // 250 + 1})?",
+            "answer": f"The {topic} for {program} students is published by the {category} office each semester.",
+            "category": category,
+            "keywords": topic.split() + [program.lower()],
+            "languages": {},
+        }))
+    return "\n".join(lines)
+
+
+async def start_local_stack(args: argparse.Namespace):
+    """Connect the in-memory database, load models, seed FAQs and warm up"""
+    from admission import admission
+    from database import db
+    from ingest import ingest_faqs
+    from nlp import nlp_service
+
+    if args.mongo_url:
+        import motor.motor_asyncio
+        client = motor.motor_asyncio.AsyncIOMotorClient(args.mongo_url)
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("The local stack needs mongomock-motor (pip install mongomock-motor) or --mongo-url")
+        client = AsyncMongoMockClient()
+    await db.connect(client)
+
+    if args.model:
+        settings.HF_MODEL_NAME = args.model
+    await nlp_service.initialize()
+    nlp_service.translator = StubTranslator(args.translate_ms)
+
+    if args.faqs:
+        with open(args.faqs, encoding="utf-8-sig") as source:
+            content = source.read()
+        file_format = "jsonl" if args.faqs.endswith((".jsonl", ".ndjson")) else "csv"
+    else:
+        content, file_format = synthetic_faqs(args.synthetic_faqs), "jsonl"
+    await ingest_faqs(content, file_format, update_index=False)
+    await nlp_service.load_faqs(db.iter_faq_records())
+    await nlp_service.warm_up()
+
+    if not args.keep_rate_limits:
+        # Every simulated client shares one address; rate limits would measure themselves
+        admission.session_limiter.rate = 0
+        admission.ip_limiter.rate = 0
+
+
+class Workload:
+    """Draws requests from the endpoint, chat-kind and language mixes"""
+
+    def __init__(self, args: argparse.Namespace, questions: Dict[str, List[str]], seed: int):
+        self.rng = random.Random(seed)
+        self.endpoints = parse_weights(args.mix)
+        self.chat_kinds = parse_weights(args.chat_mix)
+        self.languages = parse_weights(args.languages)
+        self.questions = questions
+        self.sessions = [str(uuid.uuid4()) for _ in range(args.sessions)]
+
+    def _pick(self, weights: Dict[str, float]) -> str:
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def _faq_question(self, language: str) -> str:
+        from nlp import WARMUP_QUERIES
+
+        candidates = self.questions.get(language)
+        if candidates:
+            return self.rng.choice(candidates)
+        return WARMUP_QUERIES.get(language, WARMUP_QUERIES["en"])
+
+    def next_request(self) -> Tuple[str, str, str, Dict[str, Any]]:
+        """(report name, method, path, httpx kwargs)"""
+        endpoint = self._pick(self.endpoints)
+        language = self._pick(self.languages)
+        if endpoint == "popular":
+            return "/popular-questions", "GET", "/popular-questions", {"params": {"language": language}}
+        if endpoint == "stats":
+            return "/analytics/stats", "GET", "/analytics/stats", {"params": {"days": 7}}
+
+        kind = self._pick(self.chat_kinds)
+        if kind == "greeting":
+            text = GREETINGS.get(language, GREETINGS["en"])
+        elif kind == "fallback":
+            text = self.rng.choice(FALLBACK_QUERIES)
+        else:
+            text = self._faq_question(language)
+        body = {"message": text, "language": "auto", "session_id": self.rng.choice(self.sessions)}
+        return f"/chat ({kind})", "POST", "/chat", {"json": body}
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, rps: float, duration: float) -> List[Tuple[str, int, float]]:
+    """Send Poisson arrivals at rps for duration seconds; returns (name, status, latency seconds)"""
+    results: List[Tuple[str, int, float]] = []
+
+    async def fire(scheduled: float, name: str, method: str, path: str, kwargs: Dict[str, Any]):
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0  # timeout or connection failure
+        results.append((name, status, time.perf_counter() - scheduled))
+
+    tasks = []
+    start = time.perf_counter()
+    next_send = start
+    while next_send < start + duration:
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(fire(next_send, *workload.next_request())))
+        next_send += workload.rng.expovariate(rps)
+    await asyncio.gather(*tasks)
+    return results
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results: List[Tuple[str, int, float]], duration: float, slo_ms: float) -> Dict[str, Any]:
+    groups: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+    for name, status, latency in results:
+        groups[name].append((status, latency))
+        groups["all"].append((status, latency))
+
+    endpoints = {}
+    for name, samples in sorted(groups.items()):
+        latencies = sorted(latency * 1000 for _, latency in samples)
+        statuses = defaultdict(int)
+        for status, _ in samples:
+            statuses[str(status)] += 1
+        ok = statuses.get("200", 0)
+        endpoints[name] = {
+            "requests": len(samples),
+            "ok": ok,
+            "statuses": dict(statuses),
+            "throughput_rps": round(ok / duration, 2),
+            "latency_ms": {
+                f"p{q}": round(percentile(latencies, q), 1) for q in (50, 90, 95, 99)
+            } | {"max": round(latencies[-1], 1) if latencies else 0.0},
+        }
+
+    overall = endpoints.get("all", {})
+    return {
+        "endpoints": endpoints,
+        "meets_slo": bool(overall) and overall["latency_ms"]["p95"] <= slo_ms and overall["ok"] == overall["requests"],
+    }
+
+
+def print_level(rps: float, summary: Dict[str, Any]):
+    print(f"\n== {rps:g} req/s offered {'(meets SLO)' if summary['meets_slo'] else '(SLO missed)'}")
+    print(f"{'endpoint':<24}{'reqs':>7}{'ok':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, stats in summary["endpoints"].items():
+        latency = stats["latency_ms"]
+        print(f"{name:<24}{stats['requests']:>7}{stats['ok']:>7}{stats['throughput_rps']:>8}"
+              f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}{latency['max']:>9}")
+
+
+async def run_loadtest(args: argparse.Namespace):
+    server, server_task = None, None
+    questions: Dict[str, List[str]] = {}
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from main import app
+        from nlp import nlp_service
+
+        await start_local_stack(args)
+        store = nlp_service.faq_store
+        questions = {lang: [question for question in column if question] for lang, column in store.questions.items()}
+
+        if args.serve:
+            import uvicorn
+            server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, lifespan="off", log_level="warning"))
+            server_task = asyncio.create_task(server.serve())
+            while not server.started:
+                await asyncio.sleep(0.05)
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=args.timeout)
+        else:
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=args.timeout)
+
+    report = {
+        "target": args.url or ("uvicorn" if args.serve else "asgi"),
+        "duration_s": args.duration,
+        "slo_p95_ms": args.slo_ms,
+        "mix": {"endpoints": args.mix, "chat": args.chat_mix, "languages": args.languages},
+        "levels": [],
+    }
+    try:
+        workload = Workload(args, questions, args.seed)
+        for rps in args.rps:
+            results = await run_level(client, workload, rps, args.duration)
+            summary = summarize(results, args.duration, args.slo_ms)
+            report["levels"].append({"offered_rps": rps, **summary})
+            print_level(rps, summary)
+    finally:
+        await client.aclose()
+        if server is not None:
+            server.should_exit = True
+            await server_task
+
+    passing = [level["offered_rps"] for level in report["levels"] if level["meets_slo"]]
+    report["max_rps_meeting_slo"] = max(passing) if passing else None
+    print(f"\nHighest offered rate meeting p95 <= {args.slo_ms:g}ms: {report['max_rps_meeting_slo']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as target:
+            json.dump(report, target, indent=2, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Load an already running server instead of a local stack")
+    target.add_argument("--serve", action="store_true", help="Serve the app with uvicorn in-process")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rps", type=float, nargs="+", default=[10], help="Offered request rates to step through")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per rate level")
+    parser.add_argument("--slo-ms", type=float, default=300, help="p95 latency objective")
+    parser.add_argument("--timeout", type=float, default=10, help="Per-request timeout in seconds")
+    parser.add_argument("--mix", default="chat=0.9,popular=0.07,stats=0.03", help="Endpoint weights")
+    parser.add_argument("--chat-mix", default="faq=0.75,greeting=0.1,fallback=0.15", help="/chat message kind weights")
+    parser.add_argument("--languages", default="en=0.6,hi=0.25,ta=0.15", help="Query language weights")
+    parser.add_argument("--sessions", type=int, default=500, help="Distinct simulated sessions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--faqs", help="CSV or JSONL FAQ file for the local stack")
+    parser.add_argument("--synthetic-faqs", type=int, default=1000, help="Generated FAQs when --faqs is not given")
+    parser.add_argument("--model", help="Override HF_MODEL_NAME for the local stack")
+    parser.add_argument("--mongo-url", help="Use this MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--translate-ms", type=float, default=80, help="Latency of the stub translator")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Leave per-session/IP rate limits on")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_loadtest(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,39 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from contextlib import asynccontextmanager
 import uvicorn
+import asyncio
 import logging
+import json
+import time
 from datetime import datetime
+from typing import Optional
 import os
 
 # Import our modules
 from config import settings
-from model import ChatMessage, ChatResponse, FeedbackRequest, ConversationStats
+from model import ChatMessage, ChatResponse, FeedbackRequest, ConversationStats, IngestReport
 from database import db
 from nlp import nlp_service
 from chatbot_service import chatbot_service
+from admission import admission, AdmissionRejected
+from memory import format_summary, log_memory_periodically, memory_report, start_tracing
+from popularity import popularity_index, refresh_popularity_periodically
+from http_cache import CachePolicy, HTTPCacheMiddleware, ResponseCache
+from logging_setup import dropped_records, setup_logging
 from data_seeder import DataSeeder
+from export import build_export_query, iter_ndjson
+from ingest import ingest_faqs
+from materialize import translation_materializer
+from retention import archive_conversations_periodically, check_index_coverage
+from tenants import UnknownTenant, tenant_registry
+from shadow import shadow_evaluator
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Configure logging (queued, structured, sampled)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 @asynccontextmanager
@@ -29,6 +41,10 @@ async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     # Startup
     logger.info("Starting Campus Chatbot Application...")
+    start_tracing()
+    memory_logger = None
+    popularity_refresher = None
+    archiver = None
     
     try:
         # Initialize database
@@ -42,10 +58,35 @@ async def lifespan(app: FastAPI):
         # Seed sample data (uncomment for first run)
         # await data_seeder.seed_sample_faqs()
         
-        # Load FAQs and create embeddings
-        faqs = await db.get_all_faqs()
-        await nlp_service.update_faq_embeddings(faqs)
-        logger.info(f"Loaded {len(faqs)} FAQs and created embeddings")
+        # Stream FAQs and create embeddings
+        await nlp_service.load_faqs(db.iter_faq_records())
+        logger.info(f"Loaded {len(nlp_service.faq_store)} FAQs and created embeddings")
+        
+        # Rank suggestions by demand from the conversation logs, refreshed periodically
+        popularity_refresher = asyncio.create_task(refresh_popularity_periodically())
+        
+        # Load the pinned tenants' indexes; other tenants load on their first request
+        await tenant_registry.preload()
+        
+        # Roll up and remove conversations past the retention period
+        if settings.CONVERSATION_RETENTION_MODE == "archive":
+            archiver = asyncio.create_task(archive_conversations_periodically())
+        
+        # Catch up on FAQs missing machine translations (runs in the background)
+        translation_materializer.schedule()
+        
+        # Warm up the pipeline before /ready reports the replica ready
+        if settings.WARMUP_ENABLED:
+            await nlp_service.warm_up()
+        else:
+            nlp_service.warmup_complete = True
+        
+        # Score a sample of live queries with the candidate encoder, if one is configured
+        await shadow_evaluator.start()
+        
+        if settings.MEMORY_LOG_INTERVAL > 0:
+            memory_logger = asyncio.create_task(log_memory_periodically())
+        logger.info(f"Memory after startup: {format_summary(await memory_report())}")
         
         logger.info("Application startup completed successfully!")
         
@@ -57,7 +98,13 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    for task in (memory_logger, popularity_refresher, archiver):
+        if task is not None:
+            task.cancel()
+    await translation_materializer.stop()
+    await shadow_evaluator.stop()
     try:
+        await nlp_service.close()
         await db.close()
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
@@ -71,6 +118,34 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Cache read-mostly endpoints (added first so CORS headers are applied per request, outside the cache)
+def _languages_version() -> str:
+    return json.dumps([settings.SUPPORTED_LANGUAGES, settings.LANGUAGE_NAMES], sort_keys=True)
+
+def _popular_questions_version() -> str:
+    # popularity_index.version changes when a background re-rank replaces the table served meanwhile
+    refreshed_at = popularity_index.refreshed_at
+    return (
+        f"{nlp_service.snapshot.version}:{popularity_index.version}:{tenant_registry.generation}:"
+        f"{refreshed_at.timestamp() if refreshed_at else 0}"
+    )
+
+def _stats_version() -> str:
+    # Stats are re-aggregated once per rollup period
+    return str(int(time.time() // settings.STATS_ROLLUP_INTERVAL))
+
+response_cache = ResponseCache(settings.HTTP_CACHE_MAX_ENTRIES)
+if settings.HTTP_CACHE_ENABLED:
+    app.add_middleware(
+        HTTPCacheMiddleware,
+        policies={
+            "/languages": CachePolicy(settings.HTTP_CACHE_MAX_AGE["/languages"], _languages_version),
+            "/popular-questions": CachePolicy(settings.HTTP_CACHE_MAX_AGE["/popular-questions"], _popular_questions_version),
+            "/analytics/stats": CachePolicy(settings.HTTP_CACHE_MAX_AGE["/analytics/stats"], _stats_version, private=True),
+        },
+        cache=response_cache,
+    )
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -116,14 +191,57 @@ async def health_check():
             }
         )
 
+def _client_ip(request: Request) -> Optional[str]:
+    """Client address for IP rate limits: the socket peer, or the address a trusted proxy forwarded"""
+    forwarded_for = request.headers.get("x-forwarded-for")
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR and forwarded_for:
+        # The proxy appends the peer it saw; earlier entries are client-supplied
+        return forwarded_for.split(",")[-1].strip()
+    return request.client.host if request.client else None
+
+def _rejection_response(rejection: AdmissionRejected) -> JSONResponse:
+    return JSONResponse(
+        status_code=rejection.status_code,
+        content={"detail": "Too many requests" if rejection.status_code == 429 else "Server busy", "reason": rejection.reason},
+        headers={"Retry-After": str(rejection.retry_after)}
+    )
+
+# Readiness check, gated on warm-up
+@app.get("/ready")
+async def readiness_check():
+    """Readiness check: 200 once models are loaded and warm-up has finished, 503 before"""
+    ready = nlp_service.is_initialized and nlp_service.warmup_complete
+    content = {
+        "ready": ready,
+        "faq_count": len(nlp_service.faq_store),
+        "index_version": nlp_service.snapshot.version,
+        "warmup_timings_ms": nlp_service.warmup_timings
+    }
+    return content if ready else JSONResponse(status_code=503, content=content)
+
 # Main chat endpoint
 @app.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, request: Request):
     """Main chat endpoint for processing user messages"""
     try:
-        logger.info(f"Processing message: {message.message[:50]}...")
-        response = await chatbot_service.process_message(message)
-        logger.info(f"Generated response with confidence: {response.confidence}")
+        tenant_registry.resolve(message.tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    try:
+        admission.check_rate(message.session_id, _client_ip(request))
+    except AdmissionRejected as rejection:
+        return _rejection_response(rejection)
+    
+    try:
+        try:
+            async with admission.slot():
+                response = await chatbot_service.process_message(message)
+        except AdmissionRejected as rejection:
+            if settings.ADMISSION_OVERLOAD_MODE != "degrade":
+                return _rejection_response(rejection)
+            admission.record_degraded(rejection.reason)
+            response = await chatbot_service.process_message(message, degraded=True)
         return response
         
     except Exception as e:
@@ -154,12 +272,14 @@ async def detect_language(request: dict):
 
 # Get conversation history
 @app.get("/conversation/{session_id}")
-async def get_conversation_history(session_id: str):
-    """Get conversation history for a session"""
+async def get_conversation_history(session_id: str, limit: int = 20, cursor: Optional[str] = None):
+    """Get a page of conversation history for a session; pass next_cursor to fetch older turns"""
     try:
-        history = await chatbot_service.get_session_history(session_id)
-        return {"session_id": session_id, "history": history}
+        history, next_cursor = await chatbot_service.get_session_history(session_id, limit, cursor)
+        return {"session_id": session_id, "history": history, "next_cursor": next_cursor}
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting conversation history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get conversation history: {str(e)}")
@@ -188,10 +308,15 @@ async def submit_feedback(feedback: FeedbackRequest):
 
 # Get popular questions
 @app.get("/popular-questions")
-async def get_popular_questions(language: str = "en", category: str = None):
+async def get_popular_questions(language: str = "en", category: str = None, tenant_id: Optional[str] = None):
     """Get popular questions based on category and language"""
     try:
-        questions = await chatbot_service.get_popular_questions(language, category)
+        tenant_registry.resolve(tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    try:
+        questions = await chatbot_service.get_popular_questions(language, category, tenant_id)
         return {
             "language": language,
             "category": category,
@@ -245,6 +370,109 @@ async def get_analytics_stats(days: int = 30):
         logger.error(f"Error getting analytics: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get analytics: {str(e)}")
 
+@app.get("/analytics/recent-conversations")
+async def get_recent_conversations(hours: int = 24, limit: int = 50, cursor: Optional[str] = None):
+    """Get a page of recent conversations; pass next_cursor to fetch older ones"""
+    try:
+        conversations, next_cursor = await db.get_recent_conversations(hours, limit, cursor)
+        for conv in conversations:
+            conv["id"] = str(conv.pop("_id"))
+        
+        return {
+            "conversations": conversations,
+            "next_cursor": next_cursor,
+            "period_hours": hours
+        }
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting recent conversations: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get recent conversations: {str(e)}")
+
+# Streaming export for analysts
+@app.get("/export/{kind}")
+async def export_documents(kind: str, since: Optional[datetime] = None, until: Optional[datetime] = None, language: Optional[str] = None):
+    """Stream conversations or feedback as NDJSON, filtered by date range and language"""
+    try:
+        # Validate before the response starts streaming
+        build_export_query(kind, since, until, language)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return StreamingResponse(
+        iter_ndjson(kind, since, until, language),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{kind}.ndjson"'}
+    )
+
+# Admission control counters
+@app.get("/admin/admission")
+async def get_admission_stats():
+    """Current /chat concurrency, queue depth, rejected/degraded and coalesced request counts"""
+    return {
+        **admission.stats(),
+        "coalescing": {
+            "answers": chatbot_service.answer_flights.stats(),
+            "translations": nlp_service.translation_flights.stats()
+        },
+        "match_stages": dict(nlp_service.match_counters),
+        "dropped_log_records": dropped_records(),
+        "http_cache": response_cache.stats()
+    }
+
+# Memory accounting
+@app.get("/admin/memory")
+async def get_memory_report(top: int = 0):
+    """Bytes held by models, FAQ indexes, sessions and caches, process RSS and (if tracing) top allocation sites"""
+    try:
+        return await memory_report(top)
+    except Exception as e:
+        logger.error(f"Error collecting memory report: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to collect memory report: {str(e)}")
+
+# Shadow evaluation of the candidate encoder
+@app.get("/admin/shadow")
+async def get_shadow_summary():
+    """Top-1 agreement, score deltas and per-language latency of the primary vs the candidate encoder"""
+    return shadow_evaluator.summary()
+
+# Tenant index registry
+@app.get("/admin/tenants")
+async def get_tenant_stats():
+    """Loaded tenant indexes, shared indexes, memory use against the budget and per-tenant hit/load/eviction counts"""
+    return tenant_registry.stats()
+
+# Index coverage of hot conversation queries
+@app.get("/admin/indexes")
+async def get_index_coverage():
+    """Explain each hot conversation query and report whether an index serves it"""
+    try:
+        return {"queries": await check_index_coverage()}
+    except Exception as e:
+        logger.error(f"Error checking index coverage: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to check index coverage: {str(e)}")
+
+# Bulk FAQ ingestion
+@app.post("/admin/faqs/ingest", response_model=IngestReport)
+async def ingest_faq_file(file: UploadFile = File(...), dry_run: bool = False, tenant_id: Optional[str] = None):
+    """Ingest a CSV or JSONL file of a tenant's FAQs and update its live index with the new or changed ones"""
+    try:
+        tenant_id = tenant_registry.resolve(tenant_id)
+    except UnknownTenant as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    try:
+        content = (await file.read()).decode("utf-8-sig")
+        file_format = "jsonl" if (file.filename or "").endswith((".jsonl", ".ndjson")) else "csv"
+        return await ingest_faqs(content, file_format, dry_run=dry_run, tenant_id=tenant_id)
+        
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Could not read FAQ file: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error ingesting FAQs: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to ingest FAQs: {str(e)}")
+
 # Web interface (if templates exist)
 @app.get("/", response_class=HTMLResponse)
 async def web_interface(request: Request):
@@ -348,8 +576,7 @@ async def internal_error_handler(request: Request, exc):
 async def refresh_faq_embeddings():
     """Background task to refresh FAQ embeddings periodically"""
     try:
-        faqs = await db.get_all_faqs()
-        await nlp_service.update_faq_embeddings(faqs)
+        await nlp_service.load_faqs(db.iter_faq_records())
         logger.info("FAQ embeddings refreshed successfully")
     except Exception as e:
         logger.error(f"Error refreshing FAQ embeddings: {e}")
@@ -362,7 +589,8 @@ if __name__ == "__main__":
             host=settings.HOST,
             port=settings.PORT,
             reload=settings.DEBUG,
-            log_level="info"
+            log_level="info",
+            log_config=None  # keep uvicorn's records on the application's queued handler
         )
     except Exception as e:
         logger.error(f"Failed to start server: {e}")
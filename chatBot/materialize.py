@@ -0,0 +1,163 @@
+"""Ingestion-time machine translation of FAQs into every supported language.
+
+For each FAQ missing a question or answer in one of SUPPORTED_LANGUAGES,
+the English text is translated (one batch call per language per chunk of
+FAQs) and stored as languages.<lang> with origin "machine" and a digest of
+the English source. Human-provided entries are never touched; machine
+entries are redone when the English question or answer changes. The new
+questions are then embedded into the live index, so requests never have
+to translate FAQ content. Until the startup sweep has run, missing content
+is still translated per request rather than served in English.
+
+Usage:
+    python materialize.py            # fill in every FAQ of every tenant
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from config import settings
+from database import db
+from model import FAQRecord
+from nlp import nlp_service, question_digest
+from tenants import tenant_registry
+
+logger = logging.getLogger(__name__)
+
+MACHINE_ORIGIN = "machine"
+
+
+def source_digest(faq: FAQRecord) -> str:
+    """Digest of the English text a machine translation was made from"""
+    return question_digest(f"{faq.question}\n{faq.answer}")
+
+
+def missing_languages(faq: FAQRecord) -> List[str]:
+    """Supported languages with no usable entry: absent, incomplete, or machine-made from older English text"""
+    missing = []
+    for lang in settings.SUPPORTED_LANGUAGES:
+        if lang == "en":
+            continue
+        content = faq.languages.get(lang) or {}
+        if content.get("origin") == MACHINE_ORIGIN:
+            if content.get("source") != source_digest(faq):
+                missing.append(lang)
+        elif not content.get("question") or not content.get("answer"):
+            missing.append(lang)
+    return missing
+
+
+async def translate_chunk(faqs: List[FAQRecord]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    """{faq_id: {lang: content}} for the missing languages of a chunk of FAQs"""
+    needed: Dict[str, List[FAQRecord]] = {}
+    for faq in faqs:
+        for lang in missing_languages(faq):
+            needed.setdefault(lang, []).append(faq)
+
+    translations: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for lang, lang_faqs in needed.items():
+        texts = [text for faq in lang_faqs for text in (faq.question, faq.answer)]
+        translated = await nlp_service.translate_batch(texts, lang, "en")
+        for i, faq in enumerate(lang_faqs):
+            content = faq.languages.get(lang) or {}
+            machine = content.get("origin") == MACHINE_ORIGIN
+            # Keep a human question or answer if only the other half was missing
+            question = translated[2 * i] if machine or not content.get("question") else content["question"]
+            answer = translated[2 * i + 1] if machine or not content.get("answer") else content["answer"]
+            if question is None or answer is None:
+                continue  # a needed half failed to translate; retried on the next run
+            translations.setdefault(faq.id, {})[lang] = {
+                "question": question,
+                "answer": answer,
+                "origin": MACHINE_ORIGIN,
+                "source": source_digest(faq),
+            }
+    return translations
+
+
+async def materialize_translations(faq_ids: Optional[Iterable[str]] = None, update_index: bool = True) -> int:
+    """Translate and store missing languages for the given FAQs (all when None); returns FAQs updated"""
+    start = time.perf_counter()
+    if faq_ids is None:
+        faqs = [faq async for faq in db.iter_faq_records(tenant_id=None)]
+    else:
+        faqs = await db.get_faq_records(list(faq_ids))
+
+    pending = [faq for faq in faqs if missing_languages(faq)]
+    updated_ids: List[str] = []
+    for chunk_start in range(0, len(pending), settings.MATERIALIZE_BATCH_SIZE):
+        chunk = pending[chunk_start:chunk_start + settings.MATERIALIZE_BATCH_SIZE]
+        translations = await translate_chunk(chunk)
+        await db.set_faq_translations(translations)
+        updated_ids.extend(translations)
+
+    if updated_ids and update_index and nlp_service.is_initialized:
+        # Embed the new language questions into each tenant's live index
+        by_tenant: Dict[str, List[FAQRecord]] = {}
+        for record in await db.get_faq_records(updated_ids):
+            by_tenant.setdefault(record.tenant_id or settings.DEFAULT_TENANT, []).append(record)
+        for tenant_id, records in by_tenant.items():
+            await tenant_registry.apply_faq_changes(tenant_id, records)
+
+    logger.info(f"Materialized translations for {len(updated_ids)} of {len(pending)} incomplete FAQs in {time.perf_counter() - start:.1f}s")
+    return len(updated_ids)
+
+
+class TranslationMaterializer:
+    """Background worker that materializes translations for scheduled FAQs, one batch at a time"""
+
+    def __init__(self):
+        self.pending: Set[str] = set()
+        self.sweep_pending = False
+        self.worker: Optional[asyncio.Task] = None
+
+    def schedule(self, faq_ids: Optional[Iterable[str]] = None):
+        """Queue FAQs (or, with None, every FAQ) for translation"""
+        if not settings.MATERIALIZE_TRANSLATIONS:
+            return
+        if faq_ids is None:
+            self.sweep_pending = True
+        else:
+            self.pending.update(faq_ids)
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.sweep_pending or self.pending:
+            try:
+                if self.sweep_pending:
+                    self.sweep_pending = False
+                    self.pending.clear()
+                    await materialize_translations()
+                    # Every FAQ has had its translation attempt; requests stop translating live
+                    nlp_service.translations_materialized = True
+                else:
+                    faq_ids, self.pending = self.pending, set()
+                    await materialize_translations(faq_ids)
+            except Exception as e:
+                logger.error(f"Error materializing translations: {e}")
+
+    async def stop(self):
+        if self.worker is not None and not self.worker.done():
+            self.worker.cancel()
+
+
+# Global translation materializer
+translation_materializer = TranslationMaterializer()
+
+
+async def run_materialize():
+    await db.connect()
+    try:
+        # Only the translator is needed; the encoder is not loaded
+        nlp_service.translator = await nlp_service._create_translator()
+        await materialize_translations(update_index=False)
+    finally:
+        await nlp_service.close()
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(run_materialize())
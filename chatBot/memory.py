@@ -0,0 +1,182 @@
+"""In-process memory accounting.
+
+Reports the size of each major structure (models, FAQ index snapshot,
+sessions, rate-limit and coalescing state) next to process RSS, optionally
+with the top tracemalloc allocation sites. Index and store sizes are
+estimated from array sizes and entry counts when a snapshot is built; the
+object graphs that have to be walked (sessions, rate-limit buckets) are
+walked on a worker thread so the event loop keeps serving requests.
+"""
+import asyncio
+import sys
+import tracemalloc
+import types
+from array import array
+from collections import deque
+from typing import Any, Dict, List
+import logging
+
+import numpy as np
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Shared program structure, never owned by the data being measured
+SKIPPED_TYPES = (types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj: Any) -> int:
+    """Approximate bytes held by an object graph, counting shared objects once"""
+    seen = set()
+    stack = [obj]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+
+        size += sys.getsizeof(obj)
+        if isinstance(obj, np.ndarray):
+            # Views share their base's buffer; memory-mapped pages belong to the file cache
+            if obj.base is None and not isinstance(obj, np.memmap):
+                size += obj.nbytes
+        elif isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            stack.extend(obj)
+        elif not isinstance(obj, (str, bytes, int, float, bool, array)):
+            if hasattr(obj, "__dict__"):
+                stack.append(vars(obj))
+            for slot in getattr(type(obj), "__slots__", ()):
+                if hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+def model_bytes(model) -> int:
+    """Parameter and buffer bytes of a torch module (0 if not loaded)"""
+    if model is None:
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+
+
+def process_rss() -> Dict[str, int]:
+    """Current and peak resident set size in bytes"""
+    usage = {}
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(("VmRSS:", "VmHWM:")):
+                    key = "rss_bytes" if line.startswith("VmRSS") else "peak_rss_bytes"
+                    usage[key] = int(line.split()[1]) * 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage["peak_rss_bytes"] = peak if sys.platform == "darwin" else peak * 1024
+    return usage
+
+
+def start_tracing():
+    if settings.MEMORY_TRACEMALLOC_FRAMES > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(settings.MEMORY_TRACEMALLOC_FRAMES)
+        logger.info(f"tracemalloc started ({settings.MEMORY_TRACEMALLOC_FRAMES} frames)")
+
+
+def top_allocations(limit: int) -> List[Dict[str, Any]]:
+    if not tracemalloc.is_tracing():
+        return []
+    stats = tracemalloc.take_snapshot().statistics("lineno")
+    return [
+        {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+        for stat in stats[:limit]
+    ]
+
+
+def snapshot_bytes(snapshot) -> Dict[str, int]:
+    """Estimated bytes of a FAQ index snapshot's parts, from array sizes and build-time estimates"""
+    vector_index, cascade_index = snapshot.vector_index, snapshot.cascade_index
+    return {
+        "store_bytes": snapshot.store.nbytes,
+        "vector_index_bytes": vector_index.nbytes if vector_index is not None else 0,
+        "cascade_index_bytes": cascade_index.nbytes if cascade_index is not None else 0,
+        "lexical_index_bytes": snapshot.lexical_index.nbytes if snapshot.lexical_index is not None else 0,
+        "row_tables_bytes": (
+            snapshot.row_faq_indices.nbytes
+            + 8 * len(snapshot.row_languages)  # pointers to interned language codes
+            + sum(rows.nbytes for rows in snapshot.language_partitions.values())
+            + sum(rows.nbytes for rows in snapshot.search_partitions.values() if rows is not None)
+        ),
+    }
+
+
+async def memory_report(top: int = 0) -> Dict[str, Any]:
+    """Size of each major in-process structure, in bytes"""
+    from admission import admission
+    from chatbot_service import chatbot_service
+    from nlp import nlp_service
+    from tenants import tenant_registry
+
+    loop = asyncio.get_event_loop()
+    snapshot = nlp_service.snapshot
+    sessions = list(chatbot_service.active_sessions.values())
+    buckets = [admission.session_limiter.buckets, admission.ip_limiter.buckets]
+    report = {
+        **process_rss(),
+        "models": {
+            "main": model_bytes(nlp_service.model),
+            "cascade": model_bytes(nlp_service.cascade_model),
+        },
+        "faq_index": {
+            "version": snapshot.version,
+            "faqs": len(snapshot.store),
+            **snapshot_bytes(snapshot),
+        },
+        "tenants": {
+            "loaded": len(tenant_registry.loaded),
+            "shared_indexes": len(tenant_registry.artifacts),
+            "bytes": tenant_registry.memory_bytes(),
+        },
+        "sessions": {
+            "count": len(sessions),
+            "bytes": await loop.run_in_executor(None, deep_sizeof, sessions),
+        },
+        "caches": {
+            "session_rate_limit_buckets": len(admission.session_limiter.buckets),
+            "ip_rate_limit_buckets": len(admission.ip_limiter.buckets),
+            "rate_limit_bytes": await loop.run_in_executor(None, deep_sizeof, buckets),
+            "answers_in_flight": len(chatbot_service.answer_flights.in_flight),
+            "translations_in_flight": len(nlp_service.translation_flights.in_flight),
+        },
+    }
+    if top:
+        report["top_allocations"] = await loop.run_in_executor(None, top_allocations, top)
+    return report
+
+
+def format_summary(report: Dict[str, Any]) -> str:
+    index = report["faq_index"]
+    caches = report["caches"]
+    return (
+        f"rss={report.get('rss_bytes', 0) / MB:.0f}MB peak={report.get('peak_rss_bytes', 0) / MB:.0f}MB "
+        f"models={sum(report['models'].values()) / MB:.0f}MB "
+        f"vectors={(index['vector_index_bytes'] + index['cascade_index_bytes']) / MB:.1f}MB "
+        f"store={index['store_bytes'] / MB:.1f}MB lexical={index['lexical_index_bytes'] / MB:.1f}MB "
+        f"sessions={report['sessions']['count']} ({report['sessions']['bytes'] / MB:.1f}MB) "
+        f"rate_limits={caches['rate_limit_bytes'] / MB:.1f}MB"
+    )
+
+
+async def log_memory_periodically():
+    """Log a one-line memory summary every MEMORY_LOG_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(settings.MEMORY_LOG_INTERVAL)
+        try:
+            logger.info(f"Memory: {format_summary(await memory_report())}")
+        except Exception as e:
+            logger.error(f"Error collecting memory report: {e}")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, NamedTuple, Optional
 from pydantic import BaseModel, Field, GetJsonSchemaHandler
 from pydantic.json_schema import JsonSchemaValue
 from pydantic import ConfigDict
@@ -32,6 +32,7 @@ class ChatMessage(BaseModel):
     language: Optional[str] = "auto"
     session_id: Optional[str] = None
     user_id: Optional[str] = None
+    tenant_id: Optional[str] = None  # Campus whose FAQs answer the message (default tenant if omitted)
 
 class FeedbackRequest(BaseModel):
     session_id: str
@@ -57,6 +58,18 @@ class ChatResponse(BaseModel):
     suggested_questions: List[str] = []
     category: Optional[str] = None
 
+class IngestReport(BaseModel):
+    rows_read: int = 0
+    invalid_rows: int = 0
+    duplicate_rows: int = 0
+    unchanged: int = 0
+    inserted: int = 0
+    updated: int = 0
+    questions_encoded: int = 0
+    elapsed_seconds: float = 0.0
+    rows_per_second: float = 0.0
+    errors: List[str] = []
+
 class LanguageDetectionResponse(BaseModel):
     detected_language: str
     confidence: float
@@ -80,6 +93,33 @@ class FAQ(BaseModel):
     updated_at: datetime = Field(default_factory=datetime.now)
     is_active: bool = True
     priority: int = 1
+    tenant_id: Optional[str] = None  # Owning campus; None is the default tenant
+    question_hash: Optional[str] = None  # Hash of the normalized English question, the dedup key
+    content_hash: Optional[str] = None  # Hash of question, answer, category, keywords and translations
+
+class FAQRecord(NamedTuple):
+    """Lightweight, unvalidated FAQ row streamed from the database for indexing"""
+    id: str
+    question: str
+    answer: str
+    keywords: List[str]
+    category: str
+    languages: Dict[str, Dict[str, str]]
+    priority: int = 1
+    tenant_id: Optional[str] = None
+
+    @classmethod
+    def from_document(cls, doc: Dict[str, Any]) -> "FAQRecord":
+        return cls(
+            id=str(doc["_id"]),
+            question=doc["question"],
+            answer=doc["answer"],
+            keywords=doc.get("keywords", []),
+            category=doc.get("category", ""),
+            languages=doc.get("languages", {}),
+            priority=doc.get("priority", 1),
+            tenant_id=doc.get("tenant_id"),
+        )
 
 class ConversationLog(BaseModel):
     model_config = ConfigDict(
@@ -97,6 +137,8 @@ class ConversationLog(BaseModel):
     detected_language: str
     confidence: float
     category: Optional[str] = None
+    faq_id: Optional[str] = None  # FAQ that answered the message, if any
+    tenant_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.now)
     fallback_triggered: bool = False
     response_time_ms: int = 0
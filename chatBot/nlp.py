@@ -1,28 +1,128 @@
 import asyncio
-from typing import List, Tuple, Dict, Optional
+from typing import AsyncIterator, List, NamedTuple, Tuple, Dict, Optional, Union
 import logging
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from googletrans import Translator
 from langdetect import detect
 from langdetect.lang_detect_exception import LangDetectException
 import re
+import os
+import sys
+import hashlib
+import time
+import itertools
+from collections import Counter
+import httpx
 import numpy as np
 import torch
 
 # Fixed imports - using relative imports for services directory
 from config import settings
-from model import FAQ
+from model import FAQ, FAQRecord
+from faq_store import FAQEntry, FAQStore, FAQStoreBuilder
+from lexical import LexicalIndex
+from vector_index import ExactIndex, build_index, load_index
+from singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+def question_digest(question: str) -> str:
+    """Stable short hash identifying a question's text"""
+    return hashlib.sha1(question.encode("utf-8")).hexdigest()[:16]
+
+class FAQIndexSnapshot(NamedTuple):
+    """Immutable bundle of the FAQ catalogue and every structure derived from it.
+    
+    Refreshes build a complete new snapshot and publish it with one reference
+    swap; a request pins the snapshot it started with.
+    """
+    version: int
+    store: FAQStore
+    vector_index: Optional[ExactIndex]
+    lexical_index: Optional[LexicalIndex]
+    row_faq_indices: np.ndarray  # embedding row -> faq row (-1 once retired)
+    row_languages: Tuple[str, ...]  # embedding row -> question language
+    language_partitions: Dict[str, np.ndarray]  # language -> live embedding row ids
+    search_partitions: Dict[str, Optional[np.ndarray]]  # query language -> sorted rows of it plus English (None: every row)
+    cascade_index: Optional[ExactIndex] = None  # same rows, embedded by the first-stage cascade model
+    tenant_id: Optional[str] = None  # None for the default tenant's snapshot
+    
+    def partition_rows(self, language: str) -> Optional[np.ndarray]:
+        """Embedding rows for the query language plus English, or None if that is every row"""
+        if language in self.search_partitions:
+            return self.search_partitions[language]
+        return self.search_partitions.get("en")
+
+def build_search_partitions(language_partitions: Dict[str, np.ndarray]) -> Dict[str, Optional[np.ndarray]]:
+    """Sorted embedding rows searched first for each query language: its own partition plus English"""
+    live_rows = sum(len(rows) for rows in language_partitions.values())
+    partitions: Dict[str, Optional[np.ndarray]] = {}
+    for language in set(settings.SUPPORTED_LANGUAGES) | set(language_partitions) | {"en"}:
+        parts = [language_partitions[lang] for lang in {language, "en"} if lang in language_partitions]
+        rows = np.sort(np.concatenate(parts)) if parts else None
+        partitions[language] = rows if rows is not None and len(rows) < live_rows else None
+    return partitions
+
+EMPTY_SNAPSHOT = FAQIndexSnapshot(0, FAQStore(), None, None, np.empty(0, dtype=np.int64), (), {}, {})
+
+# Fallback warm-up queries for languages the loaded FAQs have no questions in
+WARMUP_QUERIES = {
+    "en": "What is the fee structure for the B.Tech program?",
+    "hi": "बी.टेक कार्यक्रम की फीस संरचना क्या है?",
+    "ta": "பி.டெக் படிப்பிற்கான கட்டண அமைப்பு என்ன?",
+    "te": "బి.టెక్ ప్రోగ్రామ్ ఫీజు నిర్మాణం ఏమిటి?",
+    "kn": "ಬಿ.ಟೆಕ್ ಕಾರ್ಯಕ್ರಮದ ಶುಲ್ಕ ರಚನೆ ಏನು?",
+    "mr": "बी.टेक अभ्यासक्रमाची फी रचना काय आहे?",
+    "gu": "બી.ટેક પ્રોગ્રામનું ફી માળખું શું છે?",
+    "bn": "বি.টেক প্রোগ্রামের ফি কাঠামো কী?",
+}
+
 class NLPService:
     def __init__(self):
         self.model = None
+        self.cascade_model = None
         self.translator = None
-        self.faq_embeddings = None
-        self.faqs = []
+        self.snapshot = EMPTY_SNAPSHOT
+        self.snapshot_versions = itertools.count(EMPTY_SNAPSHOT.version + 1)  # unique across every tenant's snapshots
+        self.index_lock = asyncio.Lock()  # Serializes index writers; readers never lock
+        self.pending_encodes = 0
+        self.translation_flights = SingleFlight("translations")
         self.is_initialized = False
+        self.warmup_complete = False
+        self.warmup_timings: Dict[str, Dict[str, float]] = {}  # language -> stage -> ms (last round)
+        self.match_counters = Counter()  # which stage answered each query
+        self.translations_materialized = False  # set once the first full materialization sweep has run
+    
+    @property
+    def faq_store(self) -> FAQStore:
+        return self.snapshot.store
+    
+    @property
+    def translates_live(self) -> bool:
+        """Translate missing FAQ content per request: when enabled, or until the first materialization sweep completes"""
+        return settings.LIVE_TRANSLATION_FALLBACK or (
+            settings.MATERIALIZE_TRANSLATIONS and not self.translations_materialized
+        )
+    
+    def _new_snapshot(self, store: FAQStore, vector_index: Optional[ExactIndex], lexical_index: Optional[LexicalIndex],
+                      row_faq_indices: np.ndarray, row_languages: Tuple[str, ...],
+                      cascade_index: Optional[ExactIndex] = None) -> FAQIndexSnapshot:
+        partitions: Dict[str, List[int]] = {}
+        for row_idx in np.flatnonzero(row_faq_indices >= 0).tolist():
+            partitions.setdefault(row_languages[row_idx], []).append(row_idx)
+        language_partitions = {lang: np.array(rows, dtype=np.int64) for lang, rows in partitions.items()}
+        
+        return FAQIndexSnapshot(
+            version=next(self.snapshot_versions),
+            store=store,
+            vector_index=vector_index,
+            lexical_index=lexical_index,
+            row_faq_indices=row_faq_indices,
+            row_languages=row_languages,
+            language_partitions=language_partitions,
+            search_partitions=build_search_partitions(language_partitions),
+            cascade_index=cascade_index,
+        )
     
     async def initialize(self):
         """Initialize NLP models and components"""
@@ -32,8 +132,13 @@ class NLPService:
             # Load sentence transformer model
             self.model = SentenceTransformer(settings.HF_MODEL_NAME)
             
-            # Initialize translator
-            self.translator = Translator()
+            # Optional small first-stage model for cascaded matching
+            if settings.CASCADE_MODEL_NAME:
+                self.cascade_model = SentenceTransformer(settings.CASCADE_MODEL_NAME)
+                logger.info(f"Cascade enabled: {settings.CASCADE_MODEL_NAME} answers first, {settings.HF_MODEL_NAME} on escalation")
+            
+            # Initialize translator on one shared, pooled HTTP client
+            self.translator = await self._create_translator()
             
             self.is_initialized = True
             logger.info("NLP Service initialized successfully")
@@ -42,6 +147,42 @@ class NLPService:
             logger.error(f"Failed to initialize NLP Service: {e}")
             raise
     
+    async def _create_translator(self, transport: Optional[httpx.AsyncBaseTransport] = None) -> Translator:
+        """googletrans client whose requests share one bounded connection pool.
+        
+        transport replaces the network, e.g. with a local HTTP stand-in in tests.
+        """
+        kwargs = {"service_urls": settings.TRANSLATE_SERVICE_URLS} if settings.TRANSLATE_SERVICE_URLS else {}
+        translator = Translator(
+            http2=settings.TRANSLATE_HTTP2,
+            proxy=settings.TRANSLATE_PROXY,
+            timeout=httpx.Timeout(settings.TRANSLATE_TIMEOUT),
+            list_operation_max_concurrency=settings.TRANSLATE_BATCH_CONCURRENCY,
+            **kwargs
+        )
+        
+        # Pool limits can only be set when a client is built: rebuild the library's
+        # client with its headers (User-Agent, Referer), timeout and proxy, and close it
+        library_client = translator.client
+        translator.client = httpx.AsyncClient(
+            http2=settings.TRANSLATE_HTTP2,
+            proxy=settings.TRANSLATE_PROXY,
+            headers=library_client.headers,
+            timeout=library_client.timeout,
+            limits=httpx.Limits(
+                max_connections=settings.TRANSLATE_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TRANSLATE_MAX_CONNECTIONS
+            ),
+            transport=transport
+        )
+        await library_client.aclose()
+        return translator
+    
+    async def close(self):
+        """Release the translator's connection pool"""
+        if self.translator is not None and hasattr(self.translator, "client"):
+            await self.translator.client.aclose()
+    
     def detect_language(self, text: str) -> Tuple[str, float]:
         """Detect language of input text"""
         try:
@@ -87,10 +228,9 @@ class NLPService:
             if target_language == source_language or target_language == "auto":
                 return text
             
-            # Use asyncio to make blocking call async
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None, 
+            # Concurrent requests for the same translation share one call
+            result = await self.translation_flights.do(
+                (text, target_language, source_language),
                 lambda: self.translator.translate(text, src=source_language, dest=target_language)
             )
             
@@ -100,111 +240,541 @@ class NLPService:
             logger.error(f"Translation failed: {e}")
             return text  # Return original text if translation fails
     
-    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
-        """Generate embeddings for a list of texts"""
+    async def translate_batch(self, texts: List[str], target_language: str, source_language: str = "auto") -> List[Optional[str]]:
+        """Translate several texts; texts that could not be translated come back as None.
+        
+        googletrans sends one HTTP request per distinct text, at most
+        TRANSLATE_BATCH_CONCURRENCY at a time, over the shared pool.
+        """
+        try:
+            if target_language == source_language or target_language == "auto" or not texts:
+                return list(texts)
+            
+            unique = list(dict.fromkeys(texts))
+            results = await self.translation_flights.do(
+                (tuple(unique), target_language, source_language),
+                lambda: self.translator.translate(unique, src=source_language, dest=target_language)
+            )
+            
+            translated = {
+                original: (result.text if result and result.text else None)
+                for original, result in zip(unique, results)
+            }
+            return [translated[text] for text in texts]
+            
+        except Exception as e:
+            logger.error(f"Batch translation failed: {e}")
+            return [None] * len(texts)
+    
+    async def warm_up(self) -> Dict[str, Dict[str, float]]:
+        """Run representative queries in every supported language through the request pipeline.
+        
+        Pays for lazy tokenizer setup, torch kernel/allocator warm-up and langdetect
+        profile loading before real traffic does. Translation is skipped.
+        """
+        if not self.is_initialized:
+            raise RuntimeError("NLP Service not initialized")
+        
+        start = time.perf_counter()
+        snapshot = self.snapshot
+        loop = asyncio.get_event_loop()
+        queries = {
+            lang: self._warmup_query(snapshot, lang) for lang in settings.SUPPORTED_LANGUAGES
+        }
+        
+        # One batched encode of every query warms the larger batch shapes too
+        await loop.run_in_executor(None, self.generate_embeddings, list(queries.values()))
+        if self.cascade_model is not None:
+            await loop.run_in_executor(None, self.generate_embeddings, list(queries.values()), self.cascade_model)
+        
+        timings: Dict[str, Dict[str, float]] = {}
+        for _ in range(max(settings.WARMUP_ROUNDS, 1)):
+            for lang, query in queries.items():
+                stages = {}
+                
+                stage_start = time.perf_counter()
+                self.detect_language(query)
+                stages["detect_ms"] = (time.perf_counter() - stage_start) * 1000
+                
+                # Encode explicitly: the match below may take the lexical shortcut
+                stage_start = time.perf_counter()
+                await loop.run_in_executor(None, self.generate_embeddings, [query])
+                stages["encode_ms"] = (time.perf_counter() - stage_start) * 1000
+                
+                stage_start = time.perf_counter()
+                matches = await self.find_best_match(query, lang, top_k=3, snapshot=snapshot)
+                stages["match_ms"] = (time.perf_counter() - stage_start) * 1000
+                
+                stage_start = time.perf_counter()
+                if matches:
+                    await self.generate_response(matches[0][0], lang, translate=False)
+                stages["response_ms"] = (time.perf_counter() - stage_start) * 1000
+                
+                timings[lang] = {stage: round(ms, 2) for stage, ms in stages.items()}
+        
+        self.warmup_timings = timings
+        self.warmup_complete = True
+        slowest = max(timings.items(), key=lambda item: sum(item[1].values()))
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f}s for {len(timings)} languages (slowest last round: {slowest[0]} {slowest[1]})")
+        return timings
+    
+    def _warmup_query(self, snapshot: FAQIndexSnapshot, language: str) -> str:
+        """A real FAQ question in the language if one is loaded, otherwise a built-in sample"""
+        column = snapshot.store.questions.get(language, ())
+        question = next((question for question in column if question), None)
+        return question or WARMUP_QUERIES.get(language, WARMUP_QUERIES["en"])
+    
+    def generate_embeddings(self, texts: List[str], model: Optional[SentenceTransformer] = None) -> np.ndarray:
+        """Generate embeddings for a list of texts (with the main model unless another is given)"""
         if not self.is_initialized:
             raise RuntimeError("NLP Service not initialized")
         
-        return self.model.encode(texts)
+        return (model or self.model).encode(texts)
     
     async def update_faq_embeddings(self, faqs: List[FAQ]):
         """Update FAQ embeddings for similarity search"""
+        async def iterate():
+            for faq in faqs:
+                yield faq
+        
+        await self.load_faqs(iterate())
+    
+    async def load_faqs(self, records: AsyncIterator[Union[FAQ, FAQRecord]]):
+        """Build a new index snapshot from a stream of FAQs and publish it"""
+        async with self.index_lock:
+            snapshot = await self._build_snapshot(records)
+            self.snapshot = snapshot
+        logger.info(f"Published FAQ index version {snapshot.version} ({len(snapshot.store)} FAQs)")
+    
+    async def _build_snapshot(self, records: AsyncIterator[Union[FAQ, FAQRecord]], persist: bool = True) -> FAQIndexSnapshot:
+        """Build the search indexes from a stream of FAQs, encoding chunks while the stream is read.
+        
+        persist saves the vectors to VECTOR_INDEX_PATH; only the default tenant's index is persisted.
+        """
         try:
-            self.faqs = faqs
+            loop = asyncio.get_event_loop()
+            reusable = await loop.run_in_executor(None, self._load_persisted_vectors)
             
-            # Prepare texts for embedding (questions in multiple languages)
-            all_questions = []
-            for faq in faqs:
-                # Add English question
-                all_questions.append(faq.question)
+            builder = FAQStoreBuilder()
+            row_faq_indices, row_languages = [], []  # per embedding row
+            vector_chunks, digest_chunks, cascade_chunks = [], [], []
+            pending_questions = []
+            in_flight = None
+            
+            async def collect():
+                if in_flight is not None:
+                    digests, vectors, cascade_vectors = await in_flight
+                    digest_chunks.append(digests)
+                    vector_chunks.append(vectors)
+                    cascade_chunks.append(cascade_vectors)
+            
+            async for faq in records:
+                faq_idx = builder.append(faq)
                 
-                # Add questions in other languages
+                # Add English question, then questions in other languages
+                row_faq_indices.append(faq_idx)
+                row_languages.append("en")
+                pending_questions.append(faq.question)
                 for lang, content in faq.languages.items():
                     if 'question' in content and content['question']:
-                        all_questions.append(content['question'])
+                        row_faq_indices.append(faq_idx)
+                        row_languages.append(lang)
+                        pending_questions.append(content['question'])
+                
+                if len(pending_questions) >= settings.EMBEDDING_CHUNK_SIZE:
+                    # Keep one chunk encoding in the executor while the cursor fetches the next batch
+                    await collect()
+                    in_flight = loop.run_in_executor(None, self._encode_chunk, pending_questions, reusable)
+                    pending_questions = []
             
-            if all_questions:
-                # Generate embeddings
-                loop = asyncio.get_event_loop()
-                self.faq_embeddings = await loop.run_in_executor(
-                    None, self.generate_embeddings, all_questions
+            if pending_questions:
+                await collect()
+                in_flight = loop.run_in_executor(None, self._encode_chunk, pending_questions, reusable)
+            await collect()
+            
+            faq_store = builder.build()
+            
+            # Lexical index: one document per FAQ (keywords plus every question variant)
+            lexical_index = LexicalIndex([faq_store.search_texts(row) for row in range(len(faq_store))])
+            
+            vector_index = None
+            cascade_index = None
+            if row_languages:
+                embeddings = np.concatenate(vector_chunks)
+                digests = np.concatenate(digest_chunks)
+                vector_chunks.clear()
+                vector_index = await loop.run_in_executor(
+                    None,
+                    lambda: build_index(settings.VECTOR_INDEX_TYPE, np.arange(len(embeddings)), embeddings, **self._index_params())
                 )
-                logger.info(f"Generated embeddings for {len(all_questions)} FAQ questions")
+                if self.cascade_model is not None:
+                    cascade_embeddings = np.concatenate(cascade_chunks)
+                    cascade_chunks.clear()
+                    cascade_index = await loop.run_in_executor(
+                        None,
+                        lambda: build_index(settings.VECTOR_INDEX_TYPE, np.arange(len(cascade_embeddings)), cascade_embeddings, **self._index_params())
+                    )
+                reused = sum(1 for digest in digests.tolist() if digest in reusable[0])
+                logger.info(f"Indexed {len(row_languages)} FAQ questions in {len(set(row_languages))} languages ({reused} reused, {settings.VECTOR_INDEX_TYPE}/{settings.EMBEDDING_STORAGE} index)")
+                
+                if persist and settings.VECTOR_INDEX_PATH and reused < len(row_languages):
+                    await loop.run_in_executor(
+                        None,
+                        lambda: vector_index.save(settings.VECTOR_INDEX_PATH, model=settings.HF_MODEL_NAME, question_digests=digests)
+                    )
+            
+            # Partition embedding rows by language so searches can skip unrelated languages
+            return self._new_snapshot(
+                faq_store,
+                vector_index,
+                lexical_index,
+                np.array(row_faq_indices, dtype=np.int64),
+                tuple(sys.intern(lang) for lang in row_languages),
+                cascade_index,
+            )
             
         except Exception as e:
             logger.error(f"Failed to update FAQ embeddings: {e}")
             raise
     
-    async def find_best_match(self, user_query: str, language: str = "en", top_k: int = 3) -> List[Tuple[FAQ, float, str]]:
-        """Find best matching FAQ for user query"""
+    async def apply_faq_changes(self, changed: List[Union[FAQ, FAQRecord]], removed_ids: List[str] = ()) -> int:
+        """Apply new/edited and removed FAQs to the live indexes, encoding only the changed FAQs' questions.
+        
+        The new snapshot is published with a single swap; returns the number of questions encoded.
+        """
+        async with self.index_lock:
+            snapshot, encoded = await self._apply_changes(self.snapshot, changed, removed_ids)
+            self.snapshot = snapshot
+        logger.info(f"Published FAQ index version {snapshot.version} ({len(snapshot.store)} FAQs)")
+        return encoded
+    
+    async def _apply_changes(self, old: FAQIndexSnapshot, changed: List[Union[FAQ, FAQRecord]],
+                             removed_ids: List[str]) -> Tuple[FAQIndexSnapshot, int]:
+        loop = asyncio.get_event_loop()
+        old_store = old.store
+        changed_by_id = {str(faq.id): faq for faq in changed}
+        removed = set(map(str, removed_ids))
+        
+        # Rebuild the (cheap, text-only) store, remembering where each old row went
+        builder = FAQStoreBuilder()
+        new_row_of_old = np.full(len(old_store), -1, dtype=np.int64)
+        stale_old_rows, encode_rows = [], []
+        for old_row, record in enumerate(old_store.records()):
+            if record.id in removed:
+                stale_old_rows.append(old_row)
+                continue
+            replacement = changed_by_id.pop(record.id, None)
+            new_row = builder.append(replacement or record)
+            if replacement is not None:
+                stale_old_rows.append(old_row)
+                encode_rows.append(new_row)
+            else:
+                new_row_of_old[old_row] = new_row
+        for faq in changed_by_id.values():
+            encode_rows.append(builder.append(faq))
+        faq_store = builder.build()
+        
+        # Question variants of new and edited FAQs, encoded in large batches
+        new_faq_indices, new_languages, questions = [], [], []
+        for row in encode_rows:
+            for lang in faq_store.questions:
+                question = faq_store.question(row, lang)
+                if question:
+                    new_faq_indices.append(row)
+                    new_languages.append(lang)
+                    questions.append(question)
+        
+        async def encode(model: SentenceTransformer) -> np.ndarray:
+            embeddings = np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+            for start in range(0, len(questions), settings.EMBEDDING_CHUNK_SIZE):
+                chunk = await loop.run_in_executor(
+                    None, self.generate_embeddings, questions[start:start + settings.EMBEDDING_CHUNK_SIZE], model
+                )
+                embeddings = np.concatenate([embeddings, chunk])
+            return embeddings
+        
+        embeddings = await encode(self.model)
+        cascade_embeddings = await encode(self.cascade_model) if self.cascade_model is not None else None
+        
+        lexical_index = await loop.run_in_executor(
+            None, lambda: LexicalIndex([faq_store.search_texts(row) for row in range(len(faq_store))])
+        )
+        
+        # Old embedding rows keep their ids; rows of replaced/removed FAQs are dropped from the index
+        old_row_faq_indices = old.row_faq_indices
+        stale_ids = np.flatnonzero(np.isin(old_row_faq_indices, stale_old_rows))
+        remapped = np.where(old_row_faq_indices >= 0, new_row_of_old[np.maximum(old_row_faq_indices, 0)], -1)
+        new_ids = np.arange(len(old_row_faq_indices), len(old_row_faq_indices) + len(questions))
+        
+        def update_vectors(old_index: Optional[ExactIndex], vectors: np.ndarray) -> Optional[ExactIndex]:
+            # Copy-on-write: the published snapshot's index is never mutated
+            if old_index is None:
+                if not len(questions):
+                    return None
+                return build_index(settings.VECTOR_INDEX_TYPE, new_ids, vectors, **self._index_params())
+            
+            vector_index = old_index.copy()
+            vector_index.remove(stale_ids)
+            if len(questions):
+                vector_index.add(new_ids, vectors)
+            return vector_index
+        
+        vector_index = await loop.run_in_executor(None, update_vectors, old.vector_index, embeddings)
+        cascade_index = None
+        if cascade_embeddings is not None:
+            if old.cascade_index is None and old.vector_index is not None:
+                # Cascade enabled after the last full load; it is built on the next refresh
+                logger.warning("No cascade index to update, cascade disabled until the next FAQ refresh")
+            else:
+                cascade_index = await loop.run_in_executor(None, update_vectors, old.cascade_index, cascade_embeddings)
+        
+        row_faq_indices = np.concatenate([remapped, np.array(new_faq_indices, dtype=np.int64)])
+        row_languages = old.row_languages + tuple(sys.intern(lang) for lang in new_languages)
+        retired = int((row_faq_indices < 0).sum())
+        if retired * 4 > len(row_faq_indices):
+            # Renumber the live rows once retired ones make up a quarter, as ExactIndex compacts its tombstones
+            row_faq_indices, row_languages, vector_index, cascade_index = await loop.run_in_executor(
+                None, self._compact_rows, row_faq_indices, row_languages, vector_index, cascade_index
+            )
+            logger.info(f"Compacted {retired} retired embedding rows")
+        
+        snapshot = self._new_snapshot(
+            faq_store,
+            vector_index,
+            lexical_index,
+            row_faq_indices,
+            row_languages,
+            cascade_index,
+        )
+        logger.info(f"Applied {len(encode_rows)} changed and {len(removed)} removed FAQs ({len(questions)} questions encoded)")
+        return snapshot, len(questions)
+    
+    @staticmethod
+    def _compact_rows(row_faq_indices: np.ndarray, row_languages: Tuple[str, ...], vector_index: Optional[ExactIndex],
+                      cascade_index: Optional[ExactIndex]) -> Tuple[np.ndarray, Tuple[str, ...], Optional[ExactIndex], Optional[ExactIndex]]:
+        """Row tables and indexes with live embedding rows renumbered 0..n-1 and retired rows gone"""
+        live = np.flatnonzero(row_faq_indices >= 0)
+        new_ids = np.full(len(row_faq_indices), -1, dtype=np.int64)
+        new_ids[live] = np.arange(len(live))
+        return (
+            row_faq_indices[live],
+            tuple(row_languages[row] for row in live.tolist()),
+            vector_index.renumbered(new_ids) if vector_index is not None else None,
+            cascade_index.renumbered(new_ids) if cascade_index is not None else None,
+        )
+    
+    def _index_params(self) -> Dict[str, object]:
+        params = {"storage": settings.EMBEDDING_STORAGE, "rescore": settings.EMBEDDING_RESCORE_CANDIDATES}
+        if settings.VECTOR_INDEX_TYPE == "ivf":
+            params.update(nlist=settings.IVF_NLIST, nprobe=settings.IVF_NPROBE)
+        return params
+    
+    def _load_persisted_vectors(self) -> Tuple[Dict[str, int], Optional[np.ndarray]]:
+        """Question digest -> row map and vectors of the persisted index, for reuse without re-encoding"""
+        path = settings.VECTOR_INDEX_PATH
+        if not path or not os.path.exists(path):
+            return {}, None
+        
         try:
-            if not self.faqs or self.faq_embeddings is None:
+            index, metadata = load_index(path)
+            if str(metadata.get("model")) != settings.HF_MODEL_NAME or "question_digests" not in metadata:
+                logger.info("Persisted vector index was built with another model, re-encoding")
+                return {}, None
+            
+            rows = np.arange(len(index.ids))
+            vectors = index.exact if index.exact is not None else index._decode(rows)
+            return {str(digest): row for row, digest in enumerate(metadata["question_digests"].tolist())}, vectors
+        except Exception as e:
+            logger.warning(f"Could not load persisted vector index: {e}")
+            return {}, None
+    
+    def _encode_chunk(self, questions: List[str], reusable: Tuple[Dict[str, int], Optional[np.ndarray]]) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Digests, embeddings and cascade-model embeddings for a chunk of questions.
+        
+        Main-model embeddings are only computed for questions not already persisted.
+        """
+        reusable_rows, reusable_vectors = reusable
+        digests = [question_digest(question) for question in questions]
+        missing = [i for i, digest in enumerate(digests) if digest not in reusable_rows]
+        
+        vectors = np.empty((len(questions), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if missing:
+            vectors[missing] = self.generate_embeddings([questions[i] for i in missing])
+        for i, digest in enumerate(digests):
+            if digest in reusable_rows:
+                vectors[i] = reusable_vectors[reusable_rows[digest]]
+        
+        cascade_vectors = None
+        if self.cascade_model is not None:
+            cascade_vectors = self.generate_embeddings(questions, self.cascade_model)
+        return np.array(digests), vectors, cascade_vectors
+    
+    def _faq_question(self, faq: FAQEntry, language: str) -> str:
+        """FAQ question in the given language, falling back to English"""
+        return faq.question_in(language) or faq.question
+    
+    def find_lexical_match(self, user_query: str, language: str = "en", top_k: int = 3,
+                           snapshot: Optional[FAQIndexSnapshot] = None) -> List[Tuple[FAQEntry, float, str]]:
+        """Match a query using only the lexical index (no encoder call)"""
+        snapshot = snapshot or self.snapshot
+        if not len(snapshot.store) or snapshot.lexical_index is None:
+            return []
+        
+        matches = []
+        for faq_idx, _, confidence in snapshot.lexical_index.search(user_query, top_k):
+            if confidence < settings.CONFIDENCE_THRESHOLD:
+                continue
+            faq = snapshot.store.entry(faq_idx)
+            matches.append((faq, confidence, self._faq_question(faq, language)))
+        return matches
+    
+    def _is_confident_lexical(self, hits: List[Tuple[int, float, float]]) -> bool:
+        """Whether the top lexical hit is strong and unambiguous enough to skip the encoder"""
+        if not hits or hits[0][2] < settings.LEXICAL_SHORTCUT_THRESHOLD:
+            return False
+        if len(hits) == 1:
+            return True
+        
+        top_score, runner_up_score = hits[0][1], hits[1][1]
+        return (top_score - runner_up_score) / top_score >= settings.LEXICAL_SHORTCUT_MARGIN
+    
+    async def find_best_match(self, user_query: str, language: str = "en", top_k: int = 3,
+                              snapshot: Optional[FAQIndexSnapshot] = None,
+                              cascade: bool = True) -> List[Tuple[FAQEntry, float, str]]:
+        """Find best matching FAQ for user query against one pinned index snapshot
+        
+        Stages, cheapest first: a confident lexical hit, then (when a cascade model is
+        configured) the small encoder if its top hit is strong and clearly ahead, then
+        the full model. cascade=False skips the small encoder.
+        """
+        try:
+            snapshot = snapshot or self.snapshot
+            if not len(snapshot.store) or snapshot.vector_index is None:
                 logger.warning("No FAQs or embeddings available")
                 return []
             
-            # Generate embedding for user query
-            loop = asyncio.get_event_loop()
-            query_embedding = await loop.run_in_executor(
-                None, self.generate_embeddings, [user_query]
-            )
-            
-            # Calculate similarities
-            similarities = cosine_similarity(query_embedding, self.faq_embeddings)[0]
+            # Cheap lexical first stage: answer exact keyword hits without encoding
+            lexical_hits = snapshot.lexical_index.search(user_query, top_k) if snapshot.lexical_index else []
+            if self._is_confident_lexical(lexical_hits):
+                self.match_counters["lexical"] += 1
+                faq_idx, _, confidence = lexical_hits[0]
+                faq = snapshot.store.entry(faq_idx)
+                return [(faq, confidence, self._faq_question(faq, language))]
             
-            # Get top matches
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
+            # Degraded mode: encoder is saturated, serve lexical matches only
+            if self.pending_encodes >= settings.MAX_PENDING_ENCODES:
+                logger.warning("Encoder saturated, using lexical matching only")
+                self.match_counters["degraded"] += 1
+                return self.find_lexical_match(user_query, language, top_k, snapshot)
             
-            matches = []
-            question_index = 0
+            lexical_boost = self._lexical_boost(snapshot, user_query)
             
-            for idx in top_indices:
-                similarity_score = similarities[idx]
-                
-                if similarity_score < settings.CONFIDENCE_THRESHOLD:
-                    continue
-                
-                # Find which FAQ this question belongs to
-                current_idx = 0
-                matched_faq = None
-                matched_question = ""
-                
-                for faq in self.faqs:
-                    # Check English question
-                    if current_idx == idx:
-                        matched_faq = faq
-                        matched_question = faq.question
-                        break
-                    current_idx += 1
-                    
-                    # Check other language questions
-                    for lang, content in faq.languages.items():
-                        if current_idx == idx and 'question' in content:
-                            matched_faq = faq
-                            matched_question = content['question']
-                            break
-                        current_idx += 1
-                    
-                    if matched_faq:
-                        break
-                
-                if matched_faq:
-                    matches.append((matched_faq, similarity_score, matched_question))
+            # Small-model stage; escalate when its answer is weak or ambiguous
+            if cascade and self.cascade_model is not None and snapshot.cascade_index is not None:
+                query_embedding = await self._encode_query(user_query, self.cascade_model)
+                row_ids, similarities = self._rank(snapshot, snapshot.cascade_index, query_embedding, language, lexical_boost, top_k)
+                if self._is_confident_cascade(snapshot, row_ids, similarities):
+                    self.match_counters["cascade"] += 1
+                    return self._matches(snapshot, row_ids, similarities)
+                self.match_counters["escalated"] += 1
             
-            return matches
+            query_embedding = await self._encode_query(user_query, self.model)
+            row_ids, similarities = self._rank(snapshot, snapshot.vector_index, query_embedding, language, lexical_boost, top_k)
+            self.match_counters["full"] += 1
+            return self._matches(snapshot, row_ids, similarities)
             
         except Exception as e:
             logger.error(f"Error finding best match: {e}")
             return []
     
-    async def generate_response(self, faq: FAQ, user_language: str) -> str:
-        """Generate response in user's preferred language"""
+    def _lexical_boost(self, snapshot: FAQIndexSnapshot, user_query: str) -> np.ndarray:
+        """Lexical confidence per FAQ, used to boost semantic scores"""
+        lexical_boost = np.zeros(len(snapshot.store))
+        if settings.HYBRID_LEXICAL_WEIGHT > 0 and snapshot.lexical_index is not None:
+            for faq_idx, confidence in snapshot.lexical_index.confidences(user_query).items():
+                lexical_boost[faq_idx] = settings.HYBRID_LEXICAL_WEIGHT * confidence
+        return lexical_boost
+    
+    async def _encode_query(self, user_query: str, model: SentenceTransformer) -> np.ndarray:
+        loop = asyncio.get_event_loop()
+        self.pending_encodes += 1
+        try:
+            query_embedding = await loop.run_in_executor(
+                None, self.generate_embeddings, [user_query], model
+            )
+        finally:
+            self.pending_encodes -= 1
+        return query_embedding[0]
+    
+    def _rank(self, snapshot: FAQIndexSnapshot, vector_index: ExactIndex, query_embedding: np.ndarray,
+              language: str, lexical_boost: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top embedding rows and hybrid scores, searching the language partition before everything.
+        
+        The candidates are the union of the semantic and the lexical top hits, so an FAQ that
+        matches strongly on BM25 is scored even when its embedding ranks low.
+        """
+        candidate_count = top_k * 4
+        lexical_faqs = np.flatnonzero(lexical_boost)
+        if len(lexical_faqs) > candidate_count:
+            lexical_faqs = lexical_faqs[np.argsort(lexical_boost[lexical_faqs])[::-1][:candidate_count]]
+        lexical_rows = np.flatnonzero(np.isin(snapshot.row_faq_indices, lexical_faqs)) if len(lexical_faqs) else lexical_faqs
+        
+        def search(allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+            row_ids, semantic = vector_index.search(query_embedding, candidate_count, allowed)
+            extra_rows = lexical_rows[~np.isin(lexical_rows, row_ids)]
+            if allowed is not None:
+                extra_rows = extra_rows[np.isin(extra_rows, allowed, assume_unique=True)]
+            if len(extra_rows):
+                extra_ids, extra_semantic = vector_index.score(query_embedding, extra_rows)
+                row_ids, semantic = np.concatenate([row_ids, extra_ids]), np.concatenate([semantic, extra_semantic])
+            # Lexical evidence closes part of the gap to 1.0, never lowers a semantic score
+            scores = semantic + lexical_boost[snapshot.row_faq_indices[row_ids]] * (1 - semantic)
+            order = np.argsort(scores)[::-1][:top_k]
+            return row_ids[order], scores[order]
+        
+        # Search the detected language's partition (plus English) first
+        partition_rows = snapshot.partition_rows(language)
+        if partition_rows is not None:
+            row_ids, similarities = search(partition_rows)
+            if len(similarities) and similarities[0] >= settings.CONFIDENCE_THRESHOLD:
+                return row_ids, similarities
+        
+        # Fall back to the full cross-lingual search
+        return search(None)
+    
+    def _is_confident_cascade(self, snapshot: FAQIndexSnapshot, row_ids: np.ndarray, similarities: np.ndarray) -> bool:
+        """Whether the small model's top FAQ scores high enough and leads the next different FAQ by enough"""
+        if not len(similarities) or similarities[0] < settings.CASCADE_MIN_SCORE:
+            return False
+        
+        faq_indices = snapshot.row_faq_indices[row_ids]
+        # Another language variant of the same FAQ is not a competitor
+        others = similarities[faq_indices != faq_indices[0]]
+        runner_up = others[0] if len(others) else 0.0
+        return similarities[0] - runner_up >= settings.CASCADE_MIN_MARGIN
+    
+    def _matches(self, snapshot: FAQIndexSnapshot, row_ids: np.ndarray, similarities: np.ndarray) -> List[Tuple[FAQEntry, float, str]]:
+        matches = []
+        for row_id, similarity_score in zip(row_ids.tolist(), similarities.tolist()):
+            if similarity_score < settings.CONFIDENCE_THRESHOLD:
+                continue
+            
+            faq = snapshot.store.entry(int(snapshot.row_faq_indices[row_id]))
+            matched_question = faq.question_in(snapshot.row_languages[row_id])
+            matches.append((faq, similarity_score, matched_question))
+        
+        return matches
+    
+    async def generate_response(self, faq: FAQEntry, user_language: str, translate: bool = True) -> str:
+        """Generate response in user's preferred language (English when not translating)"""
         try:
             # Check if answer exists in user's language
-            if user_language in faq.languages and 'answer' in faq.languages[user_language]:
-                return faq.languages[user_language]['answer']
+            answer = faq.answer_in(user_language)
+            if answer:
+                return answer
             
-            # If not available in user's language, translate from English
-            if user_language != "en":
+            # Translations are materialized at ingest time; live translation only if enabled or before the first sweep
+            if user_language != "en" and translate and self.translates_live:
                 return await self.translate_text(faq.answer, user_language, "en")
             
             return faq.answer
@@ -253,27 +823,32 @@ class NLPService:
         
         return None
     
-    async def generate_suggestions(self, category: str = None, language: str = "en") -> List[str]:
+    async def generate_suggestions(self, category: str = None, language: str = "en",
+                                   snapshot: Optional[FAQIndexSnapshot] = None) -> List[str]:
         """Generate suggested questions based on category"""
         suggestions = []
         
         try:
             # Filter FAQs by category if provided
-            relevant_faqs = [faq for faq in self.faqs if not category or faq.category == category]
+            store = (snapshot or self.snapshot).store
+            relevant_rows = store.rows_in_category(category)
+            
+            # Select top 3 popular questions
+            rows = relevant_rows[:3]
+            suggestions = [store.question(row, language) for row in rows]
             
-            # Select top 3-5 popular questions
-            for faq in relevant_faqs[:5]:
-                if language in faq.languages and 'question' in faq.languages[language]:
-                    suggestions.append(faq.languages[language]['question'])
-                else:
-                    # Translate question if not available in user's language
-                    translated_question = await self.translate_text(faq.question, language, "en")
-                    suggestions.append(translated_question)
+            # Questions not (yet) materialized in the user's language: translate in one batch, or serve English
+            missing = [i for i, question in enumerate(suggestions) if not question]
+            translated: List[Optional[str]] = [None] * len(missing)
+            if missing and self.translates_live:
+                translated = await self.translate_batch([store.question(rows[i], "en") for i in missing], language, "en")
+            for i, question in zip(missing, translated):
+                suggestions[i] = question or store.question(rows[i], "en")
         
         except Exception as e:
             logger.error(f"Error generating suggestions: {e}")
         
-        return suggestions[:3]  # Return top 3 suggestions
+        return suggestions
 
 # Global NLP service instance
 nlp_service = NLPService()
\ No newline at end of file
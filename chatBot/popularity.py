@@ -0,0 +1,121 @@
+"""Popularity-ranked suggestion table built from conversation logs.
+
+A periodic job aggregates answered conversations per (FAQ, language, day),
+weights each day by exponential time decay and ranks FAQs for every
+(category, language) pair. The ranked questions, already in the right
+language, are held in memory so suggestions are a dictionary lookup.
+When the FAQ index changes the table is re-ranked on a worker thread, and
+the previous table is served until it is ready.
+"""
+import asyncio
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from database import db
+from nlp import FAQIndexSnapshot, nlp_service
+
+logger = logging.getLogger(__name__)
+
+
+class PopularityIndex:
+    def __init__(self):
+        self.language_scores: Dict[Tuple[str, str], float] = {}  # (language, faq_id) -> decayed demand
+        self.faq_scores: Dict[str, float] = {}  # faq_id -> decayed demand over all languages
+        self.table: Dict[Tuple[Optional[str], str], Tuple[Tuple[str, str], ...]] = {}  # (category, language) -> ((faq_id, question), ...)
+        self.version = -1  # index snapshot version the table was built for
+        self.refreshed_at: Optional[datetime] = None
+        self.rebuild_task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        """Re-aggregate decayed demand from the conversation logs and rebuild the table"""
+        now = datetime.now()
+        since = now - timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+        decay = math.log(2) / settings.POPULARITY_HALF_LIFE_DAYS
+
+        language_scores: Dict[Tuple[str, str], float] = defaultdict(float)
+        faq_scores: Dict[str, float] = defaultdict(float)
+        for row in await db.aggregate_faq_demand(since):
+            age_days = (now - datetime.strptime(row["_id"]["day"], "%Y-%m-%d")).total_seconds() / 86400
+            weight = row["count"] * math.exp(-decay * max(age_days, 0.0))
+            language_scores[(row["_id"]["language"], row["_id"]["faq_id"])] += weight
+            faq_scores[row["_id"]["faq_id"]] += weight
+
+        self.language_scores = dict(language_scores)
+        self.faq_scores = dict(faq_scores)
+        self.refreshed_at = now
+        await asyncio.get_event_loop().run_in_executor(None, self.rebuild, nlp_service.snapshot)
+        logger.info(f"Popularity table refreshed from {len(faq_scores)} FAQs with demand in the last {settings.POPULARITY_WINDOW_DAYS} days")
+
+    def rebuild(self, snapshot: FAQIndexSnapshot):
+        """Rank every (category, language) pair against the FAQs of a snapshot"""
+        store = snapshot.store
+        table = {}
+        for language in settings.SUPPORTED_LANGUAGES:
+            # Demand in this language first, then overall demand, then catalogue order
+            ranked_rows = sorted(
+                range(len(store)),
+                key=lambda row: (
+                    -self.language_scores.get((language, store.ids[row]), 0.0),
+                    -self.faq_scores.get(store.ids[row], 0.0),
+                    row,
+                ),
+            )
+            by_category: Dict[Optional[str], List[Tuple[str, str]]] = defaultdict(list)
+            for row in ranked_rows:
+                entry = (store.ids[row], store.question(row, language) or store.question(row, "en"))
+                for category in (None, store.category(row)):
+                    if len(by_category[category]) < settings.POPULARITY_TOP_N:
+                        by_category[category].append(entry)
+            for category, entries in by_category.items():
+                table[(category, language)] = tuple(entries)
+
+        if snapshot.version >= self.version:
+            # A rebuild for an older snapshot that finishes late must not replace a newer table
+            self.table = table
+            self.version = snapshot.version
+
+    def _schedule_rebuild(self, snapshot: FAQIndexSnapshot):
+        """Re-rank for a newer snapshot off the event loop, unless a rebuild is already running"""
+        if self.rebuild_task is None or self.rebuild_task.done():
+            self.rebuild_task = asyncio.create_task(self._rebuild_in_background(snapshot))
+
+    async def _rebuild_in_background(self, snapshot: FAQIndexSnapshot):
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, self.rebuild, snapshot)
+        except Exception as e:
+            logger.error(f"Error rebuilding popularity table: {e}")
+
+    def suggestions(self, category: Optional[str], language: str, snapshot: FAQIndexSnapshot,
+                    exclude: Optional[str] = None, limit: int = 3) -> Optional[List[str]]:
+        """Most asked questions of a category in a language, or None if there is no table for it.
+        
+        The table ranks the default tenant's FAQs; other tenants' snapshots get None.
+        """
+        if self.refreshed_at is None or snapshot.tenant_id is not None:
+            return None
+        if snapshot.version > self.version:
+            # FAQs changed since the last build; re-rank from the cached demand, serving the old table meanwhile
+            self._schedule_rebuild(snapshot)
+
+        entries = self.table.get((category or None, language))
+        if entries is None:
+            return None
+        return [question for faq_id, question in entries if faq_id != exclude][:limit]
+
+
+async def refresh_popularity_periodically():
+    """Rebuild the popularity table every POPULARITY_REFRESH_INTERVAL seconds"""
+    while True:
+        try:
+            await popularity_index.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing popularity table: {e}")
+        await asyncio.sleep(settings.POPULARITY_REFRESH_INTERVAL)
+
+
+# Global popularity index
+popularity_index = PopularityIndex()
@@ -0,0 +1,149 @@
+"""Conversation retention and index coverage checks.
+
+In "archive" mode, conversations older than the retention period are rolled
+up one whole day at a time into compact per-(day, language, category, FAQ)
+documents in the archive collection, and the raw logs are deleted only once
+their day is merged. The retention period is never shorter than the
+popularity window, so suggestion rankings have consumed a log before it
+goes. "ttl" mode leaves expiry to a Mongo TTL index instead (no rollups).
+
+The coverage check explains the hot conversation queries and reports any
+that scan the collection or sort in memory instead of walking an index.
+
+Usage:
+    python retention.py archive          # archive expired conversations now
+    python retention.py check-indexes    # exit 1 if a hot query is not index-served
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Set
+
+from config import settings
+from database import (
+    CONVERSATION_HISTORY_PROJECTION,
+    RECENT_CONVERSATION_PROJECTION,
+    conversation_retention_days,
+    db,
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_expired_conversations() -> int:
+    """Archive every whole day of conversations past the retention period; returns conversations archived"""
+    if settings.CONVERSATION_RETENTION_MODE != "archive":
+        return 0
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = today - timedelta(days=conversation_retention_days())
+    archived = 0
+    while True:
+        oldest = await db.oldest_conversation_before(cutoff)
+        if oldest is None:
+            break
+        day = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+        count = await db.archive_conversation_day(day)
+        archived += count
+        logger.info(f"Archived {count} conversations from {day.date()}")
+
+    if archived:
+        logger.info(f"Archived {archived} conversations older than {cutoff.date()}")
+    return archived
+
+
+async def archive_conversations_periodically():
+    """Archive expired conversations every ARCHIVE_INTERVAL seconds"""
+    while True:
+        try:
+            await archive_expired_conversations()
+        except Exception as e:
+            logger.error(f"Error archiving conversations: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL)
+
+
+def hot_queries() -> Dict[str, Dict[str, Any]]:
+    """The conversation queries issued on request paths and by periodic jobs, as explain_find arguments"""
+    since = datetime.now() - timedelta(days=1)
+    newest_first = [("timestamp", -1), ("_id", -1)]
+    return {
+        "conversation_history": {
+            "query": {"session_id": "explain-check"},
+            "projection": CONVERSATION_HISTORY_PROJECTION,
+            "sort": newest_first,
+            "limit": 21,
+        },
+        "recent_conversations": {
+            "query": {"timestamp": {"$gte": since}},
+            "projection": RECENT_CONVERSATION_PROJECTION,
+            "sort": newest_first,
+            "limit": 51,
+        },
+        "analytics_window": {
+            "query": {"timestamp": {"$gte": since}},
+        },
+        "faq_demand_window": {
+            "query": {"timestamp": {"$gte": since}, "faq_id": {"$ne": None}, "fallback_triggered": False},
+        },
+        "language_export": {
+            "query": {"timestamp": {"$gte": since}, "detected_language": "en"},
+            "sort": [("timestamp", 1)],
+        },
+    }
+
+
+def plan_stages(plan: Dict[str, Any]) -> Set[str]:
+    """Every stage name in a (classic or slot-based engine) query plan tree"""
+    stages = set()
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        if "stage" in node:
+            stages.add(node["stage"])
+        for key in ("inputStage", "queryPlan"):
+            if key in node:
+                stack.append(node[key])
+        stack.extend(node.get("inputStages", []))
+    return stages
+
+
+async def check_index_coverage() -> List[Dict[str, Any]]:
+    """Explain each hot query; index_served is False if it scans the collection or sorts in memory"""
+    results = []
+    for name, query in hot_queries().items():
+        explain = await db.explain_find(settings.CONVERSATIONS_COLLECTION, **query)
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        results.append({
+            "query": name,
+            "index_served": "IXSCAN" in stages and "COLLSCAN" not in stages and "SORT" not in stages,
+            "covered": "IXSCAN" in stages and "FETCH" not in stages,  # answered from the index alone
+            "stages": sorted(stages),
+        })
+    return results
+
+
+async def main(command: str) -> int:
+    await db.connect()
+    try:
+        if command == "archive":
+            await archive_expired_conversations()
+            return 0
+
+        results = await check_index_coverage()
+        for result in results:
+            status = "ok" if result["index_served"] else "NOT INDEX-SERVED"
+            print(f"{result['query']:<24} {status:<18} {', '.join(result['stages'])}")
+        return 0 if all(result["index_served"] for result in results) else 1
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["archive", "check-indexes"])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main(args.command)))
@@ -0,0 +1,203 @@
+"""Shadow evaluation of a candidate encoder on live /chat traffic.
+
+A sample of answered queries (SHADOW_SAMPLE_RATE, at most
+SHADOW_MAX_PER_MINUTE) is handed to a background worker after the primary
+answer is computed; the response never waits for it. The worker scores the
+query with the candidate encoder (SHADOW_MODEL_NAME) against its own
+vector index over the same FAQ question rows, using the same language
+partitions and lexical boost as the primary, and records per language:
+
+- top-1 agreement: whether both picked the same FAQ
+- score delta: candidate top-1 score minus the primary's confidence
+- latency of the primary match and of the candidate encode + search
+
+Shadow work runs on a dedicated single thread, is dropped when the queue
+is full, and is skipped while the primary encoder has queries pending, so
+it only uses spare capacity. Only the default tenant is shadowed.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from admission import TokenBucket
+from config import settings
+from nlp import FAQIndexSnapshot, nlp_service, question_digest
+from vector_index import ExactIndex, build_index
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowSample(NamedTuple):
+    query: str
+    language: str
+    snapshot: FAQIndexSnapshot
+    primary_faq_id: Optional[str]  # None when the primary fell back to a human
+    primary_score: float
+    primary_ms: float
+
+
+class LanguageStats:
+    def __init__(self):
+        self.samples = 0
+        self.agreements = 0
+        self.score_delta_sum = 0.0
+        self.abs_score_delta_sum = 0.0
+        self.primary_ms: Deque[float] = deque(maxlen=settings.SHADOW_LATENCY_SAMPLES)
+        self.candidate_ms: Deque[float] = deque(maxlen=settings.SHADOW_LATENCY_SAMPLES)
+
+    def summary(self) -> Dict[str, Any]:
+        def percentiles(values: Deque[float]) -> Dict[str, float]:
+            if not values:
+                return {}
+            p50, p95 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95])
+            return {"p50": round(float(p50), 2), "p95": round(float(p95), 2)}
+
+        return {
+            "samples": self.samples,
+            "top1_agreement": round(self.agreements / self.samples, 4) if self.samples else None,
+            "mean_score_delta": round(self.score_delta_sum / self.samples, 4) if self.samples else None,
+            "mean_abs_score_delta": round(self.abs_score_delta_sum / self.samples, 4) if self.samples else None,
+            "primary_ms": percentiles(self.primary_ms),
+            "candidate_ms": percentiles(self.candidate_ms),
+        }
+
+
+class ShadowEvaluator:
+    def __init__(self):
+        self.model: Optional[SentenceTransformer] = None
+        self.index: Optional[ExactIndex] = None
+        self.index_version = -1  # primary snapshot version the candidate index mirrors
+        self.vector_cache: Dict[str, np.ndarray] = {}  # question digest -> candidate embedding
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self.bucket = TokenBucket(settings.SHADOW_MAX_PER_MINUTE / 60.0, 10)
+        self.languages: Dict[str, LanguageStats] = defaultdict(LanguageStats)
+        self.counters = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return self.worker is not None
+
+    async def start(self):
+        """Load the candidate encoder and start the shadow worker"""
+        if not settings.SHADOW_MODEL_NAME:
+            return
+        loop = asyncio.get_event_loop()
+        self.model = await loop.run_in_executor(self.executor, SentenceTransformer, settings.SHADOW_MODEL_NAME)
+        self.queue = asyncio.Queue(maxsize=settings.SHADOW_QUEUE_SIZE)
+        self.worker = asyncio.create_task(self._run())
+        logger.info(f"Shadow evaluation of {settings.SHADOW_MODEL_NAME} on {settings.SHADOW_SAMPLE_RATE:.0%} of queries")
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.worker = None
+        self.executor.shutdown(wait=False)
+
+    def offer(self, sample: ShadowSample):
+        """Queue a query for shadow scoring if it is sampled and within the rate limit; never blocks"""
+        if not self.enabled or sample.snapshot.tenant_id is not None:
+            return
+        if random.random() >= settings.SHADOW_SAMPLE_RATE:
+            return
+        self.counters["sampled"] += 1
+        if self.bucket.take() > 0:
+            self.counters["rate_limited"] += 1
+            return
+        try:
+            self.queue.put_nowait(sample)
+        except asyncio.QueueFull:
+            self.counters["queue_full"] += 1
+
+    async def _run(self):
+        while True:
+            sample = await self.queue.get()
+            if nlp_service.pending_encodes > 0:
+                # The primary encoder is busy; shadow work would compete with it
+                self.counters["skipped_busy"] += 1
+                continue
+            try:
+                await self._evaluate(sample)
+                self.counters["evaluated"] += 1
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.error(f"Error in shadow evaluation: {e}")
+
+    async def _evaluate(self, sample: ShadowSample):
+        loop = asyncio.get_event_loop()
+        snapshot = sample.snapshot
+        if snapshot.version != self.index_version:
+            if snapshot.version < self.index_version:
+                return  # sampled before the last refresh
+            await loop.run_in_executor(self.executor, self._build_index, snapshot)
+        if self.index is None:
+            return
+
+        candidate_faq_id, candidate_score, candidate_ms = await loop.run_in_executor(self.executor, self._score, sample)
+
+        stats = self.languages[sample.language]
+        stats.samples += 1
+        stats.agreements += candidate_faq_id == sample.primary_faq_id
+        stats.score_delta_sum += candidate_score - sample.primary_score
+        stats.abs_score_delta_sum += abs(candidate_score - sample.primary_score)
+        stats.primary_ms.append(sample.primary_ms)
+        stats.candidate_ms.append(candidate_ms)
+
+    def _score(self, sample: ShadowSample) -> Tuple[Optional[str], float, float]:
+        """Candidate top-1 FAQ id, its score and the encode + search ms; runs on the shadow thread"""
+        snapshot = sample.snapshot
+        start = time.perf_counter()
+        query_embedding = self.model.encode([sample.query])[0]
+        lexical_boost = nlp_service._lexical_boost(snapshot, sample.query)
+        row_ids, scores = nlp_service._rank(snapshot, self.index, query_embedding, sample.language, lexical_boost, 1)
+        candidate_ms = (time.perf_counter() - start) * 1000
+
+        if len(scores) and scores[0] >= settings.CONFIDENCE_THRESHOLD:
+            return snapshot.store.ids[int(snapshot.row_faq_indices[row_ids[0]])], float(scores[0]), candidate_ms
+        return None, 0.0, candidate_ms
+
+    def _build_index(self, snapshot: FAQIndexSnapshot):
+        """Candidate-encoder index over the snapshot's live question rows, reusing unchanged embeddings"""
+        start = time.perf_counter()
+        rows = np.flatnonzero(snapshot.row_faq_indices >= 0)
+        questions = [
+            snapshot.store.question(int(snapshot.row_faq_indices[row]), snapshot.row_languages[row]) or ""
+            for row in rows.tolist()
+        ]
+        digests = [question_digest(question) for question in questions]
+        missing = sorted({digest: question for digest, question in zip(digests, questions) if digest not in self.vector_cache}.items())
+        if missing:
+            vectors = self.model.encode([question for _, question in missing])
+            self.vector_cache.update(zip((digest for digest, _ in missing), vectors))
+        self.vector_cache = {digest: self.vector_cache[digest] for digest in digests}
+
+        self.index = None
+        if len(rows):
+            self.index = build_index("exact", rows, np.stack([self.vector_cache[digest] for digest in digests]))
+        self.index_version = snapshot.version
+        self.counters["index_builds"] += 1
+        logger.info(f"Built shadow index for FAQ index version {snapshot.version} ({len(missing)} questions encoded in {time.perf_counter() - start:.1f}s)")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "candidate_model": settings.SHADOW_MODEL_NAME,
+            "primary_model": settings.HF_MODEL_NAME,
+            "sample_rate": settings.SHADOW_SAMPLE_RATE,
+            "index_version": self.index_version,
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            **self.counters,
+            "languages": {language: stats.summary() for language, stats in sorted(self.languages.items())},
+        }
+
+
+# Global shadow evaluator
+shadow_evaluator = ShadowEvaluator()
@@ -0,0 +1,33 @@
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one in-flight computation.
+
+    The first caller starts the computation as a task; callers arriving while it
+    runs await the same task. Nothing is cached: once the task finishes the key
+    is forgotten. A caller being cancelled does not cancel the shared task.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.counters = Counter()
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        future = self.in_flight.get(key)
+        if future is None:
+            self.counters["computed"] += 1
+            future = asyncio.ensure_future(compute())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self.in_flight), **self.counters}
@@ -0,0 +1,209 @@
+"""Per-tenant FAQ indexes, loaded lazily and evicted LRU under a memory budget.
+
+The default tenant's index is NLPService.snapshot: built at startup, kept
+current by ingestion and never evicted. Every other tenant's FAQs are read
+and indexed the first time a request for it arrives; concurrent first
+requests share one load. A tenant's FAQs are put in a canonical order and
+fingerprinted by the text the indexes are built from (questions and
+keywords), so tenants with identical catalogues share one set of vector and
+lexical indexes and only keep their own FAQ store. Past
+TENANT_MEMORY_BUDGET_MB the least recently used tenants not in
+TENANT_PINNED are evicted. Per-tenant hit, load and eviction counts show
+which tenants are worth pinning.
+"""
+import logging
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
+
+from config import settings
+from database import db
+from faq_store import FAQStoreBuilder
+from memory import MB, snapshot_bytes
+from model import FAQ, FAQRecord
+from nlp import FAQIndexSnapshot, nlp_service, question_digest
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class UnknownTenant(ValueError):
+    pass
+
+
+class TenantIndex(NamedTuple):
+    snapshot: FAQIndexSnapshot
+    fingerprint: str  # identifies the shared vector/lexical indexes
+    store_bytes: int  # the tenant's own FAQ store
+
+
+class SharedArtifacts(NamedTuple):
+    snapshot: FAQIndexSnapshot  # snapshot the indexes were built for
+    index_bytes: int
+
+
+def index_digest(record: FAQRecord) -> str:
+    """Digest of the FAQ text the search indexes are built from"""
+    questions = "\n".join(
+        f"{lang}:{content['question']}" for lang, content in sorted(record.languages.items()) if content.get("question")
+    )
+    return question_digest(f"{record.question}\n{questions}\n{' '.join(record.keywords)}")
+
+
+def index_bytes(snapshot: FAQIndexSnapshot) -> int:
+    """Estimated bytes of a snapshot's search indexes and row tables (everything but the FAQ store)"""
+    sizes = snapshot_bytes(snapshot)
+    return sum(size for part, size in sizes.items() if part != "store_bytes")
+
+
+class TenantRegistry:
+    def __init__(self):
+        self.loaded: "OrderedDict[str, TenantIndex]" = OrderedDict()  # least recently used first
+        self.artifacts: Dict[str, SharedArtifacts] = {}  # fingerprint -> indexes shared by loaded tenants
+        self.loads = SingleFlight("tenant_loads")
+        self.metrics: Dict[str, Counter] = defaultdict(Counter)
+        self.generation = 0  # bumped whenever a tenant index is loaded or dropped
+        self.tenant_generations = Counter()  # tenant -> drops so far; a load that spans a drop is discarded
+
+    def resolve(self, tenant_id: Optional[str]) -> str:
+        """Tenant of a request; raises UnknownTenant for tenants that are not configured"""
+        tenant_id = tenant_id or settings.DEFAULT_TENANT
+        if tenant_id != settings.DEFAULT_TENANT and tenant_id not in settings.TENANT_NAMES:
+            raise UnknownTenant(f"Unknown tenant: {tenant_id}")
+        return tenant_id
+
+    def college_name(self, tenant_id: str) -> str:
+        return settings.TENANT_NAMES.get(tenant_id, settings.COLLEGE_NAME)
+
+    async def snapshot(self, tenant_id: Optional[str]) -> FAQIndexSnapshot:
+        """Current FAQ index snapshot of a tenant, loading it on first use"""
+        tenant_id = self.resolve(tenant_id)
+        metrics = self.metrics[tenant_id]
+        if tenant_id == settings.DEFAULT_TENANT:
+            metrics["hits"] += 1
+            return nlp_service.snapshot
+
+        entry = self.loaded.get(tenant_id)
+        if entry is not None:
+            metrics["hits"] += 1
+            self.loaded.move_to_end(tenant_id)
+            return entry.snapshot
+
+        metrics["misses"] += 1
+        # Requests after a drop start a fresh load rather than joining one that read the old FAQs
+        return await self.loads.do((tenant_id, self.tenant_generations[tenant_id]), lambda: self._load(tenant_id))
+
+    async def _load(self, tenant_id: str) -> FAQIndexSnapshot:
+        start = time.perf_counter()
+        generation = self.tenant_generations[tenant_id]
+        records = [record async for record in db.iter_faq_records(tenant_id=tenant_id)]
+
+        # Canonical order, so tenants with the same FAQ text build (and can share) identical indexes
+        digests = {record.id: index_digest(record) for record in records}
+        records.sort(key=lambda record: digests[record.id])
+        fingerprint = question_digest("".join(digests[record.id] for record in records))
+
+        shared = self.artifacts.get(fingerprint)
+        if shared is not None:
+            builder = FAQStoreBuilder()
+            for record in records:
+                builder.append(record)
+            snapshot = shared.snapshot._replace(
+                version=next(nlp_service.snapshot_versions), store=builder.build(), tenant_id=tenant_id
+            )
+            self.metrics[tenant_id]["shared_loads"] += 1
+        else:
+            async def iterate():
+                for record in records:
+                    yield record
+
+            snapshot = (await nlp_service._build_snapshot(iterate(), persist=False))._replace(tenant_id=tenant_id)
+
+        if self.tenant_generations[tenant_id] != generation:
+            # Dropped while loading: the FAQs read may be stale, so serve this request but do not keep them
+            self.metrics[tenant_id]["stale_loads"] += 1
+            logger.info(f"Discarded FAQ index load for tenant {tenant_id}; it was dropped while loading")
+            return snapshot
+
+        if shared is None:
+            self.artifacts[fingerprint] = SharedArtifacts(snapshot, index_bytes(snapshot))
+        self.loaded[tenant_id] = TenantIndex(snapshot, fingerprint, snapshot.store.nbytes)
+        self.generation += 1
+        load_ms = (time.perf_counter() - start) * 1000
+        self.metrics[tenant_id]["loads"] += 1
+        self.metrics[tenant_id]["load_ms"] += round(load_ms)
+        logger.info(
+            f"Loaded FAQ index for tenant {tenant_id} ({len(snapshot.store)} FAQs, "
+            f"{'shared' if shared is not None else 'built'} in {load_ms:.0f}ms)"
+        )
+
+        self._evict(keep=tenant_id)
+        return snapshot
+
+    def memory_bytes(self) -> int:
+        """Bytes held by loaded tenant indexes, counting shared indexes once"""
+        fingerprints = {entry.fingerprint for entry in self.loaded.values()}
+        return (
+            sum(self.artifacts[fingerprint].index_bytes for fingerprint in fingerprints)
+            + sum(entry.store_bytes for entry in self.loaded.values())
+        )
+
+    def _evict(self, keep: str):
+        budget = settings.TENANT_MEMORY_BUDGET_MB * MB
+        for tenant_id in list(self.loaded):
+            if self.memory_bytes() <= budget:
+                break
+            if tenant_id == keep or tenant_id in settings.TENANT_PINNED:
+                continue
+            self.drop(tenant_id)
+            self.metrics[tenant_id]["evictions"] += 1
+            logger.info(f"Evicted FAQ index of tenant {tenant_id} (over the {settings.TENANT_MEMORY_BUDGET_MB}MB budget)")
+
+    def drop(self, tenant_id: str):
+        """Forget a tenant's index; it is reloaded on the next request"""
+        self.tenant_generations[tenant_id] += 1
+        entry = self.loaded.pop(tenant_id, None)
+        if entry is None:
+            return
+        if all(other.fingerprint != entry.fingerprint for other in self.loaded.values()):
+            self.artifacts.pop(entry.fingerprint, None)
+        self.generation += 1
+
+    async def apply_faq_changes(self, tenant_id: str, changed: List[Union[FAQ, FAQRecord]], removed_ids: Iterable[str] = ()) -> int:
+        """Bring a tenant's index up to date after its FAQs changed; returns questions encoded now"""
+        if tenant_id == settings.DEFAULT_TENANT:
+            return await nlp_service.apply_faq_changes(changed, list(removed_ids))
+        # Other tenants re-index (in canonical order) on their next request
+        self.drop(tenant_id)
+        return 0
+
+    async def preload(self):
+        """Load the pinned tenants"""
+        for tenant_id in settings.TENANT_PINNED:
+            if tenant_id != settings.DEFAULT_TENANT:
+                await self.snapshot(tenant_id)
+
+    def stats(self) -> Dict[str, Any]:
+        tenants = {}
+        for tenant_id in sorted(set(self.metrics) | set(self.loaded) | set(settings.TENANT_NAMES)):
+            entry = self.loaded.get(tenant_id)
+            snapshot = nlp_service.snapshot if tenant_id == settings.DEFAULT_TENANT else entry.snapshot if entry else None
+            tenants[tenant_id] = {
+                "college_name": self.college_name(tenant_id),
+                "loaded": snapshot is not None,
+                "pinned": tenant_id in settings.TENANT_PINNED or tenant_id == settings.DEFAULT_TENANT,
+                "faqs": len(snapshot.store) if snapshot is not None else None,
+                "store_bytes": entry.store_bytes if entry is not None else None,
+                **self.metrics.get(tenant_id, {}),
+            }
+        return {
+            "loaded": len(self.loaded),
+            "shared_indexes": len(self.artifacts),
+            "memory_bytes": self.memory_bytes(),
+            "budget_bytes": settings.TENANT_MEMORY_BUDGET_MB * MB,
+            "tenants": tenants,
+        }
+
+
+# Global tenant registry
+tenant_registry = TenantRegistry()
@@ -0,0 +1,369 @@
+from typing import Optional, Tuple
+import copy
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+STORAGE_TYPES = ("float32", "float16", "int8")
+SCORE_CHUNK_ROWS = 16384  # Rows dequantized at a time while scoring compressed storage
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so dot products are cosine similarities"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first"""
+    if len(scores) <= k:
+        return np.argsort(scores)[::-1]
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _exact_path(path: str) -> str:
+    """Sidecar file holding the float32 rows of a quantized index"""
+    return f"{os.path.splitext(path)[0]}.f32.npy"
+
+
+class ExactIndex:
+    """Brute-force cosine index with incremental inserts and deletes.
+
+    Rows are addressed by caller-provided integer ids (the FAQ question rows).
+    Deleted rows are tombstoned and compacted away once they make up a
+    quarter of the matrix.
+
+    Vectors are scored from `codes`, stored as float32, float16 or int8 with
+    a per-row scale. With compressed storage the top `rescore` candidates are
+    rescored against float32 rows, which a loaded index memory-maps from a
+    sidecar file so they stay out of the resident set.
+    """
+
+    kind = "exact"
+
+    def __init__(self, dim: int, storage: str = "float32", rescore: int = 32):
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown embedding storage type: {storage}")
+        self.dim = dim
+        self.storage = storage
+        self.rescore = rescore if storage != "float32" else 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.codes = np.empty((0, dim), dtype=storage)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.exact: Optional[np.ndarray] = np.empty((0, dim), dtype=np.float32) if self.rescore else None
+        self.alive = np.empty(0, dtype=bool)
+        self.id_to_row = {}
+        self.row_lookup: Optional[np.ndarray] = None  # id -> live matrix row (-1 if none), built on first restricted search
+
+    def __len__(self) -> int:
+        return len(self.id_to_row)
+
+    @property
+    def nbytes(self) -> int:
+        """Resident bytes (memory-mapped rescoring rows are not counted)"""
+        total = self.codes.nbytes + self.scales.nbytes + self.ids.nbytes + self.alive.nbytes
+        if self.row_lookup is not None:
+            total += self.row_lookup.nbytes
+        if self.exact is not None and not isinstance(self.exact, np.memmap):
+            total += self.exact.nbytes
+        return total
+
+    def copy(self) -> "ExactIndex":
+        """Copy that can be mutated without affecting this index.
+
+        add() and compaction always allocate fresh arrays, so only the
+        tombstone mask and id map need copying; the vector data is shared.
+        """
+        clone = copy.copy(self)
+        clone.alive = self.alive.copy()
+        clone.id_to_row = dict(self.id_to_row)
+        return clone
+
+    def renumbered(self, new_ids: np.ndarray) -> "ExactIndex":
+        """Copy addressing each vector by new_ids[old id]; ids mapped to -1 must already be removed"""
+        clone = self.copy()
+        if not clone.alive.all():
+            clone._compact()
+        clone.ids = new_ids[clone.ids]
+        clone.id_to_row = {vector_id: row for row, vector_id in enumerate(clone.ids.tolist())}
+        clone.row_lookup = None
+        return clone
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.storage == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            return codes, scales.astype(np.float32)
+        return vectors.astype(self.storage), np.ones(len(vectors), dtype=np.float32)
+
+    def _decode(self, rows: np.ndarray) -> np.ndarray:
+        """Float32 (approximate, for compressed storage) vectors of the given matrix rows"""
+        return self.codes[rows].astype(np.float32) * self.scales[rows, None]
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """Insert (or replace) vectors under the given ids"""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = normalize(vectors)
+        self.remove(ids)
+
+        codes, scales = self._quantize(vectors)
+        start = len(self.ids)
+        self.ids = np.concatenate([self.ids, ids])
+        self.codes = np.concatenate([self.codes, codes])
+        self.scales = np.concatenate([self.scales, scales])
+        if self.exact is not None:
+            self.exact = np.concatenate([self.exact, vectors])
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        for offset, vector_id in enumerate(ids.tolist()):
+            self.id_to_row[vector_id] = start + offset
+        self.row_lookup = None
+        self._on_add(np.arange(start, start + len(ids)), vectors)
+
+    def remove(self, ids: np.ndarray):
+        """Delete vectors by id; unknown ids are ignored"""
+        rows = [self.id_to_row.pop(vector_id) for vector_id in np.asarray(ids).tolist() if vector_id in self.id_to_row]
+        if not rows:
+            return
+        self.alive[rows] = False
+        self.row_lookup = None
+        if (~self.alive).sum() * 4 > len(self.alive):
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive)
+        self.ids = self.ids[keep]
+        self.codes = self.codes[keep]
+        self.scales = self.scales[keep]
+        if self.exact is not None:
+            self.exact = self.exact[keep]
+        self.alive = np.ones(len(keep), dtype=bool)
+        self.id_to_row = {vector_id: row for row, vector_id in enumerate(self.ids.tolist())}
+        self._on_compact(keep)
+
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        pass
+
+    def _on_compact(self, keep: np.ndarray):
+        pass
+
+    def _rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Live matrix rows of the given ids (unknown ids skipped), in the order of the ids"""
+        if self.row_lookup is None:
+            # Published indexes are never mutated in place, so this is built once per index state
+            lookup = np.full(int(self.ids.max()) + 1 if len(self.ids) else 0, -1, dtype=np.int64)
+            live = np.flatnonzero(self.alive)
+            lookup[self.ids[live]] = live
+            self.row_lookup = lookup
+        ids = ids[ids < len(self.row_lookup)]
+        rows = self.row_lookup[ids]
+        return rows[rows >= 0]
+
+    def _candidate_rows(self, query: np.ndarray, allowed_rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if allowed_rows is not None:
+            return allowed_rows
+        return np.flatnonzero(self.alive)
+
+    def _score(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        if self.storage == "float32":
+            return self.codes[rows] @ query
+        return np.concatenate([
+            (self.codes[chunk].astype(np.float32) @ query) * self.scales[chunk]
+            for chunk in np.array_split(rows, max(1, -(-len(rows) // SCORE_CHUNK_ROWS)))
+        ])
+
+    def search(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, cosine scores) of the k nearest vectors, optionally restricted to allowed ids"""
+        query = normalize(query)[0]
+        rows = self._candidate_rows(query, self._rows_of(allowed) if allowed is not None else None)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self._score(rows, query)
+        if self.exact is None:
+            top = _top_k(scores, k)
+            return self.ids[rows[top]], scores[top]
+
+        # Rescore the best compressed candidates against the float32 rows
+        candidates = rows[_top_k(scores, max(k, self.rescore))]
+        exact_scores = self.exact[candidates] @ query
+        top = _top_k(exact_scores, k)
+        return self.ids[candidates[top]], exact_scores[top]
+
+    def score(self, query: np.ndarray, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, cosine scores) for the given ids that are in the index"""
+        query = normalize(query)[0]
+        rows = self._rows_of(np.asarray(ids, dtype=np.int64))
+        if self.exact is not None:
+            return self.ids[rows], self.exact[rows] @ query
+        return self.ids[rows], self._score(rows, query)
+
+    def _state(self) -> dict:
+        keep = np.flatnonzero(self.alive)
+        return {
+            "kind": np.array(self.kind),
+            "storage": np.array(self.storage),
+            "ids": self.ids[keep],
+            "codes": self.codes[keep],
+            "scales": self.scales[keep],
+        }
+
+    def save(self, path: str, **metadata):
+        """Persist the index (and any extra metadata arrays) to an .npz file.
+
+        Float32 rescoring rows go to a separate .f32.npy file so loading can memory-map them.
+        """
+        np.savez(path, **self._state(), **{f"meta_{key}": np.array(value) for key, value in metadata.items()})
+        if self.exact is not None:
+            np.save(_exact_path(path), np.asarray(self.exact[np.flatnonzero(self.alive)]))
+
+    @classmethod
+    def _create(cls, state, **params) -> "ExactIndex":
+        return cls(state["codes"].shape[1], storage=str(state["storage"]), **params)
+
+    @classmethod
+    def _from_state(cls, state, exact: Optional[np.ndarray], **params) -> "ExactIndex":
+        index = cls._create(state, **params)
+        index.ids = state["ids"]
+        index.codes = state["codes"]
+        index.scales = state["scales"]
+        index.exact = exact if index.rescore else None
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index.id_to_row = {vector_id: row for row, vector_id in enumerate(index.ids.tolist())}
+        return index
+
+
+class IVFFlatIndex(ExactIndex):
+    """Inverted-file index: vectors are bucketed by their nearest k-means centroid
+    and a search only scores the nprobe buckets closest to the query."""
+
+    kind = "ivf"
+
+    def __init__(self, dim: int, nlist: int = 0, nprobe: int = 8, seed: int = 0, **params):
+        super().__init__(dim, **params)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int32)  # matrix row -> list number
+
+    @property
+    def nbytes(self) -> int:
+        centroid_bytes = self.centroids.nbytes if self.centroids is not None else 0
+        return super().nbytes + self.assignments.nbytes + centroid_bytes
+
+    def train(self, vectors: np.ndarray, iterations: int = 10):
+        """Fit centroids with spherical k-means on (a sample of) the vectors"""
+        vectors = normalize(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(len(vectors))))
+        nlist = min(nlist, len(vectors))
+        rng = np.random.default_rng(self.seed)
+
+        sample = vectors
+        if len(vectors) > nlist * 64:
+            sample = vectors[rng.choice(len(vectors), nlist * 64, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for list_no in range(nlist):
+                members = sample[assignment == list_no]
+                if len(members):
+                    centroids[list_no] = members.sum(axis=0)
+            centroids = normalize(centroids)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self.assignments = np.concatenate([
+            self._assign(self._decode(rows))
+            for rows in np.array_split(np.arange(len(self.ids)), max(1, -(-len(self.ids) // SCORE_CHUNK_ROWS)))
+        ])
+
+    def _assign(self, vectors: np.ndarray, chunk_size: int = 8192) -> np.ndarray:
+        if self.centroids is None or len(vectors) == 0:
+            return np.zeros(len(vectors), dtype=np.int32)
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk_size] @ self.centroids.T, axis=1).astype(np.int32)
+            for start in range(0, len(vectors), chunk_size)
+        ])
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        super().add(ids, vectors)
+        if self.centroids is None:
+            # First insert trains the quantizer on the initial corpus
+            self.train(normalize(vectors))
+
+    def _on_add(self, rows: np.ndarray, vectors: np.ndarray):
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+
+    def _on_compact(self, keep: np.ndarray):
+        self.assignments = self.assignments[keep]
+
+    def _candidate_rows(self, query: np.ndarray, allowed_rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if self.centroids is None:
+            return super()._candidate_rows(query, allowed_rows)
+        probe = _top_k(self.centroids @ query, min(self.nprobe, self.nlist))
+        if allowed_rows is not None:
+            return allowed_rows[np.isin(self.assignments[allowed_rows], probe)]
+        return np.flatnonzero(np.isin(self.assignments, probe) & self.alive)
+
+    def _state(self) -> dict:
+        keep = np.flatnonzero(self.alive)
+        state = super()._state()
+        state["centroids"] = self.centroids if self.centroids is not None else np.empty((0, self.dim), dtype=np.float32)
+        state["assignments"] = self.assignments[keep]
+        return state
+
+    @classmethod
+    def _create(cls, state, **params) -> "IVFFlatIndex":
+        return cls(state["codes"].shape[1], nlist=len(state["centroids"]), storage=str(state["storage"]), **params)
+
+    @classmethod
+    def _from_state(cls, state, exact: Optional[np.ndarray], **params) -> "IVFFlatIndex":
+        index = super()._from_state(state, exact, **params)
+        if len(state["centroids"]):
+            index.centroids = state["centroids"]
+        index.assignments = state["assignments"]
+        return index
+
+
+INDEX_TYPES = {cls.kind: cls for cls in (ExactIndex, IVFFlatIndex)}
+
+
+def build_index(kind: str, ids: np.ndarray, vectors: np.ndarray, **params) -> ExactIndex:
+    """Build an index of the given kind ("exact" or "ivf") over the vectors"""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown vector index type: {kind}")
+    index = INDEX_TYPES[kind](np.asarray(vectors).shape[1], **params)
+    index.add(ids, vectors)
+    return index
+
+
+def load_index(path: str, **params) -> Tuple[ExactIndex, dict]:
+    """Load an index saved with save(); returns (index, metadata).
+
+    params override search-time settings such as nprobe and rescore.
+    """
+    exact = None
+    if os.path.exists(_exact_path(path)):
+        exact = np.load(_exact_path(path), mmap_mode="r")
+
+    with np.load(path) as state:
+        kind = str(state["kind"])
+        cls = INDEX_TYPES[kind]
+        search_params = {
+            name: value for name, value in params.items()
+            if name == "rescore" or (name == "nprobe" and cls is IVFFlatIndex)
+        }
+        index = cls._from_state(state, exact, **search_params)
+        metadata = {key[len("meta_"):]: state[key] for key in state.files if key.startswith("meta_")}
+    logger.info(f"Loaded {kind} vector index ({index.storage}) with {len(index)} vectors from {path}")
+    return index, metadata